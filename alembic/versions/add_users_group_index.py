@@ -0,0 +1,32 @@
+"""add partial index on users.group
+
+Revision ID: add_users_group_idx
+Revises: add_last_activity
+Create Date: 2026-08-27 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_users_group_idx'
+down_revision: Union[str, None] = 'add_last_activity'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Частичный индекс для GROUP BY "group" в метриках топ-групп:
+    # запрос становится index-only scan вместо полного скана users
+    op.create_index(
+        'idx_users_group',
+        'users',
+        ['group'],
+        postgresql_where=sa.text("\"group\" != ''")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_users_group', table_name='users')
@@ -0,0 +1,42 @@
+"""split feedback media_ids into typed columns
+
+Revision ID: feedback_media_typed
+Revises: add_users_group_idx
+Create Date: 2026-08-27 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'feedback_media_typed'
+down_revision: Union[str, None] = 'add_users_group_idx'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('feedback_messages', sa.Column('media_type', sa.String(length=20), nullable=True))
+    op.add_column('feedback_messages', sa.Column('media_file_id', sa.Text(), nullable=True))
+    # Переносим существующие записи: в media_ids всегда лежал объект
+    # с единственным ключом {тип: file_id}
+    op.execute(
+        "UPDATE feedback_messages "
+        "SET media_type = (SELECT k FROM jsonb_object_keys(media_ids::jsonb) AS k LIMIT 1), "
+        "media_file_id = (SELECT v FROM jsonb_each_text(media_ids::jsonb) AS t(k, v) LIMIT 1) "
+        "WHERE media_ids IS NOT NULL"
+    )
+    op.drop_column('feedback_messages', 'media_ids')
+
+
+def downgrade() -> None:
+    op.add_column('feedback_messages', sa.Column('media_ids', sa.Text(), nullable=True))
+    op.execute(
+        "UPDATE feedback_messages "
+        "SET media_ids = json_build_object(media_type, media_file_id)::text "
+        "WHERE media_type IS NOT NULL"
+    )
+    op.drop_column('feedback_messages', 'media_type')
+    op.drop_column('feedback_messages', 'media_file_id')
@@ -0,0 +1,44 @@
+"""store holiday dates as ISO and index range lookups
+
+Revision ID: holidays_iso_dates
+Revises: feedback_media_typed
+Create Date: 2026-08-27 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'holidays_iso_dates'
+down_revision: Union[str, None] = 'feedback_media_typed'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # DD.MM.YYYY -> YYYY-MM-DD: ISO-строки сортируются лексикографически,
+    # так что диапазонное условие start_date <= d <= end_date может
+    # использовать индекс
+    op.execute(
+        "UPDATE holidays "
+        "SET start_date = to_char(to_date(start_date, 'DD.MM.YYYY'), 'YYYY-MM-DD'), "
+        "end_date = to_char(to_date(end_date, 'DD.MM.YYYY'), 'YYYY-MM-DD') "
+        "WHERE start_date LIKE '__.__.____'"
+    )
+    op.create_index(
+        'idx_holidays_group_dates',
+        'holidays',
+        ['group', 'start_date', 'end_date']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_holidays_group_dates', table_name='holidays')
+    op.execute(
+        "UPDATE holidays "
+        "SET start_date = to_char(to_date(start_date, 'YYYY-MM-DD'), 'DD.MM.YYYY'), "
+        "end_date = to_char(to_date(end_date, 'YYYY-MM-DD'), 'DD.MM.YYYY') "
+        "WHERE start_date LIKE '____-__-__'"
+    )
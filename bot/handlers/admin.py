@@ -278,10 +278,17 @@ async def cmd_add_holidays(
         return
     
     group = parts[1]
-    start_date = parts[2]
-    end_date = parts[3]
     holiday_type = parts[4]
-    
+
+    # В БД даты хранятся в ISO (YYYY-MM-DD) - по ним работает
+    # индексный диапазонный запрос в is_holiday_or_vacation
+    try:
+        start_date = datetime.strptime(parts[2], "%d.%m.%Y").strftime("%Y-%m-%d")
+        end_date = datetime.strptime(parts[3], "%d.%m.%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        await message.answer("❌ Неверный формат даты. Пример: 01.01.2024")
+        return
+
     holiday = Holiday(
         group=group,
         start_date=start_date,
@@ -294,7 +301,7 @@ async def cmd_add_holidays(
     await message.answer(
         f"✅ Каникулы добавлены:\n"
         f"Группа: {group}\n"
-        f"Период: {start_date} - {end_date}\n"
+        f"Период: {parts[2]} - {parts[3]}\n"
         f"Тип: {holiday_type}"
     )
 
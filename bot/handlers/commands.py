@@ -25,6 +25,9 @@ from loguru import logger
 
 router = Router()
 
+# Типы групповых чатов - frozenset вместо списка в каждой проверке
+_GROUP_TYPES: frozenset = frozenset(('group', 'supergroup'))
+
 COMPARE_TEACHER_ACTION = "compare_teacher"
 MAX_COMPARE_TEACHER_PERIOD_DAYS = 10
 CHANGE_DATE_CALLBACK = "ct:change_date"
@@ -155,7 +158,7 @@ async def cmd_add_group(message: Message, session: AsyncSession):
     # TODO: Проверить валидность группы через API
     
     # Для группового чата - только админы
-    if message.chat.type in ['group', 'supergroup']:
+    if message.chat.type in _GROUP_TYPES:
         from bot.middleware.auth import is_group_admin
         if not await is_group_admin(message):
             await message.answer(
@@ -218,7 +221,7 @@ async def cmd_day(message: Message, session: AsyncSession):
     
     if not group:
         # Берем из БД
-        if message.chat.type in ['group', 'supergroup']:
+        if message.chat.type in _GROUP_TYPES:
             chat = await ChatRepository.get_by_id(session, chat_id)
             group = chat.group if chat else None
         else:
@@ -260,7 +263,7 @@ async def cmd_nextday(message: Message, session: AsyncSession):
     group = extract_group_from_text(text)
     
     if not group:
-        if message.chat.type in ['group', 'supergroup']:
+        if message.chat.type in _GROUP_TYPES:
             chat = await ChatRepository.get_by_id(session, chat_id)
             group = chat.group if chat else None
         else:
@@ -301,7 +304,7 @@ async def cmd_current(message: Message, session: AsyncSession):
     group = extract_group_from_text(text)
     
     if not group:
-        if message.chat.type in ['group', 'supergroup']:
+        if message.chat.type in _GROUP_TYPES:
             chat = await ChatRepository.get_by_id(session, chat_id)
             group = chat.group if chat else None
         else:
@@ -357,7 +360,7 @@ async def cmd_date(message: Message, session: AsyncSession):
     
     # Если группа не указана в команде, берем из БД
     if not group:
-        if message.chat.type in ['group', 'supergroup']:
+        if message.chat.type in _GROUP_TYPES:
             chat = await ChatRepository.get_by_id(session, chat_id)
             group = chat.group if chat else None
         else:
@@ -788,8 +791,10 @@ async def _send_teacher_schedule_period(
         if not lessons:
             response += "  Занятий нет\n\n"
         else:
-            for lesson in lessons:
-                formatted = schedule_service.format_lesson(lesson, schedule_type=schedule_type)
+            for pair_number, lesson in lessons:
+                formatted = schedule_service.format_lesson(
+                    lesson, lesson_number=pair_number, schedule_type=schedule_type
+                )
                 response += formatted + "\n"
             response += "\n"
         current_date += timedelta(days=1)
@@ -808,7 +813,7 @@ async def cmd_compare_teacher(
     chat_id = message.chat.id
     
     default_group = None
-    if message.chat.type in ['group', 'supergroup']:
+    if message.chat.type in _GROUP_TYPES:
         chat = await ChatRepository.get_by_id(session, chat_id)
         if chat and chat.group:
             default_group = chat.group
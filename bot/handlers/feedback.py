@@ -43,8 +43,7 @@ async def cmd_feedback(message: Message):
 async def cmd_asks(
     message: Message,
     session: AsyncSession,
-    is_global_admin: bool,
-    admin_permissions: list
+    is_global_admin: bool
 ):
     """Команда /asks - просмотр фидбеков (только для админов)"""
     # Проверяем права
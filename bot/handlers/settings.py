@@ -7,26 +7,61 @@ from aiogram.types import Message, CallbackQuery
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.repository import UserRepository, ChatRepository
-from bot.utils import build_settings_keyboard, build_subgroup_keyboard
+from bot.utils import (
+    build_settings_keyboard,
+    build_subgroup_keyboard,
+    validate_time_format,
+    StateFilter
+)
 from bot.services.state_manager import state_manager
 
 
 router = Router()
 
+# Типы групповых чатов - frozenset вместо списка в каждой проверке
+_GROUP_TYPES: frozenset = frozenset(('group', 'supergroup'))
+
+# Статусные строки интернированы на уровне модуля - при рендере
+# выбирается готовая строка вместо пересборки конкатенацией
+_DAILY_ON = "Ежедневные: ✅ Вкл\n"
+_DAILY_OFF = "Ежедневные: ❌ Выкл\n"
+_ONLINE_ON = "Онлайн-пары: ✅ Вкл\n"
+_ONLINE_OFF = "Онлайн-пары: ❌ Выкл\n"
+
+
 def _format_settings_text(
     daily_notify: bool,
     notify_online: bool,
     notification_time: str | None,
     subgroup: int | None
 ) -> str:
-    text = "⚙️ Настройки уведомлений\n\n"
-    text += f"Ежедневные: {'✅ Вкл' if daily_notify else '❌ Выкл'}\n"
-    if daily_notify and notification_time:
-        text += f"Время: {notification_time}\n"
-    text += f"Онлайн-пары: {'✅ Вкл' if notify_online else '❌ Выкл'}\n"
-    if subgroup:
-        text += f"Подгруппа: {subgroup}\n"
-    return text
+    return (
+        "⚙️ Настройки уведомлений\n\n"
+        + (_DAILY_ON if daily_notify else _DAILY_OFF)
+        + (f"Время: {notification_time}\n" if daily_notify and notification_time else "")
+        + (_ONLINE_ON if notify_online else _ONLINE_OFF)
+        + (f"Подгруппа: {subgroup}\n" if subgroup else "")
+    )
+
+
+async def _render_settings(
+    callback: CallbackQuery,
+    daily_notify: bool,
+    notify_online: bool,
+    notification_time: str | None,
+    subgroup: int | None,
+    keyboard_cleanup_service=None
+):
+    """Перерисовать сообщение настроек по актуальным значениям"""
+    await callback.message.edit_text(
+        _format_settings_text(daily_notify, notify_online, notification_time, subgroup),
+        reply_markup=build_settings_keyboard(daily_notify, notify_online, notification_time, subgroup)
+    )
+    if keyboard_cleanup_service:
+        await keyboard_cleanup_service.schedule_clear(
+            callback.message.chat.id,
+            callback.message.message_id
+        )
 
 
 @router.message(Command("settings"))
@@ -35,10 +70,10 @@ async def cmd_settings(message: Message, session: AsyncSession, keyboard_cleanup
     # В callback'ах message.from_user может быть ботом (сообщение настроек от бота).
     # В приватных чатах идентификатор пользователя равен chat.id, используем его.
     chat_id = message.chat.id
-    user_id = message.from_user.id if message.chat.type in ['group', 'supergroup'] else chat_id
+    user_id = message.from_user.id if message.chat.type in _GROUP_TYPES else chat_id
     
     # Получаем настройки
-    if message.chat.type in ['group', 'supergroup']:
+    if message.chat.type in _GROUP_TYPES:
         chat = await ChatRepository.get_by_id(session, chat_id)
         if not chat:
             await message.answer("❌ Сначала установите группу командой /add")
@@ -91,7 +126,7 @@ async def process_settings_callback(
     chat_id = callback.message.chat.id
     action = callback.data.split(":")[1]
     
-    is_group_chat = callback.message.chat.type in ['group', 'supergroup']
+    is_group_chat = callback.message.chat.type in _GROUP_TYPES
     
     if action == "toggle_daily":
         # Переключить ежедневные уведомления
@@ -119,16 +154,18 @@ async def process_settings_callback(
             notify_online = user.notify_online
             notification_time = user.notification_time
             subgroup = user.subgroup
-        
+
+        # Закрываем транзакцию до round-trip'а в Telegram, чтобы не держать
+        # соединение с БД на время сетевого вызова (100мс+)
+        await session.commit()
+
         await callback.answer(
             f"Ежедневные уведомления {'включены' if new_value else 'выключены'}"
         )
-        await callback.message.edit_text(
-            _format_settings_text(daily_notify, notify_online, notification_time, subgroup),
-            reply_markup=build_settings_keyboard(daily_notify, notify_online, notification_time, subgroup)
+        await _render_settings(
+            callback, daily_notify, notify_online, notification_time, subgroup,
+            keyboard_cleanup_service
         )
-        if keyboard_cleanup_service:
-            await keyboard_cleanup_service.schedule_clear(chat_id, callback.message.message_id)
     
     elif action == "toggle_online":
         # Переключить уведомления об онлайн-парах
@@ -156,16 +193,17 @@ async def process_settings_callback(
             notify_online = new_value
             notification_time = user.notification_time
             subgroup = user.subgroup
-        
+
+        # Аналогично toggle_daily - транзакция закрывается до вызова Telegram
+        await session.commit()
+
         await callback.answer(
             f"Уведомления об онлайн-парах {'включены' if new_value else 'выключены'}"
         )
-        await callback.message.edit_text(
-            _format_settings_text(daily_notify, notify_online, notification_time, subgroup),
-            reply_markup=build_settings_keyboard(daily_notify, notify_online, notification_time, subgroup)
+        await _render_settings(
+            callback, daily_notify, notify_online, notification_time, subgroup,
+            keyboard_cleanup_service
         )
-        if keyboard_cleanup_service:
-            await keyboard_cleanup_service.schedule_clear(chat_id, callback.message.message_id)
     
     elif action == "change_time":
         # Изменить время уведомлений
@@ -235,20 +273,24 @@ async def process_subgroup_callback(
     await cmd_settings(callback.message, session)
 
 
-@router.message(F.text.regexp(r'^\d{2}:\d{2}$'))
+@router.message(F.text, StateFilter(['changing_notify_time']))
 async def process_notification_time(message: Message, session: AsyncSession):
     """Обработка времени уведомлений"""
     user_id = message.from_user.id
     chat_id = message.chat.id
-    
-    state = state_manager.get_state(chat_id, user_id)
-    if not state or state.get('action') != 'changing_notify_time':
-        return
-    
+
     time_str = message.text
+
+    # Проверяем формат ЧЧ:ММ общим кэшированным валидатором -
+    # тем же, что использует онбординг
+    if not validate_time_format(time_str):
+        await message.answer(
+            "❌ Неверный формат времени. Укажи время в формате ЧЧ:ММ, например: 08:00"
+        )
+        return
     
     # Сохраняем время
-    if message.chat.type in ['group', 'supergroup']:
+    if message.chat.type in _GROUP_TYPES:
         await ChatRepository.update(session, chat_id, notification_time=time_str)
     else:
         await UserRepository.update(session, user_id, notification_time=time_str)
@@ -1,6 +1,7 @@
 """
 Middleware для проверки прав доступа
 """
+import functools
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
@@ -8,11 +9,15 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings, AdminPermissions
 from database.repository import AdminRepository
+from bot.services.perm_cache import perm_cache
+
+# Типы групповых чатов - frozenset вместо списка в каждой проверке
+_GROUP_TYPES: frozenset = frozenset(('group', 'supergroup'))
 
 
 class AuthMiddleware(BaseMiddleware):
     """Middleware для проверки прав доступа"""
-    
+
     async def __call__(
         self,
         handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
@@ -21,20 +26,11 @@ class AuthMiddleware(BaseMiddleware):
     ) -> Any:
         """Добавляем информацию о правах пользователя в data"""
         user_id = event.from_user.id
-        session: AsyncSession = data.get('session')
-        
+
         # Проверяем, является ли пользователь глобальным админом
-        is_global_admin = user_id in settings.admin_ids_list
-        data['is_global_admin'] = is_global_admin
-        
-        # Получаем права администратора из БД
-        permissions = []
-        if session and not is_global_admin:
-            permissions = await AdminRepository.get_permissions(session, user_id)
-        
-        data['admin_permissions'] = permissions
+        data['is_global_admin'] = user_id in settings.admin_ids_set
         data['user_id'] = user_id
-        
+
         # Продолжаем обработку
         return await handler(event, data)
 
@@ -54,7 +50,7 @@ async def is_group_admin(event: Message | CallbackQuery) -> bool:
     else:
         chat = event.chat
     
-    if chat.type not in ['group', 'supergroup']:
+    if chat.type not in _GROUP_TYPES:
         return False
     
     try:
@@ -83,10 +79,15 @@ async def check_permission(
     # Глобальные админы имеют все права
     if data.get('is_global_admin'):
         return True
-    
-    # Проверяем права из БД
+
+    # Права берем полным списком через TTL-кэш: один SELECT на админа
+    # раз в 5 минут вместо запроса на каждую команду
     user_id = data.get('user_id')
     if user_id and session:
-        return await AdminRepository.has_permission(session, user_id, permission)
-    
+        permissions = await perm_cache.get_or_fetch(
+            user_id,
+            functools.partial(AdminRepository.get_permissions, session, user_id)
+        )
+        return permission in permissions
+
     return False
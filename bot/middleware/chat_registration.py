@@ -2,14 +2,18 @@
 Middleware для автоматической регистрации чатов
 """
 from typing import Callable, Dict, Any, Awaitable
-from datetime import datetime
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
+from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.repository import ChatRepository, UserRepository
 from loguru import logger
 from bot.services.business_metrics import business_metrics_service
+from bot.services.registration_cache import registration_cache
+
+# Типы групповых чатов - frozenset вместо списка в каждой проверке
+_GROUP_TYPES: frozenset = frozenset(('group', 'supergroup'))
 
 
 class ChatRegistrationMiddleware(BaseMiddleware):
@@ -36,46 +40,44 @@ class ChatRegistrationMiddleware(BaseMiddleware):
         
         try:
             # Для групповых чатов - регистрируем чат
-            if event.chat.type in ['group', 'supergroup']:
-                chat = await ChatRepository.get_by_id(session, chat_id)
-                if not chat:
+            if event.chat.type in _GROUP_TYPES:
+                if chat_id not in registration_cache.known_chats:
                     # Создаем чат без группы (группу установит администратор)
                     thread_id = getattr(event, 'message_thread_id', None)
                     await ChatRepository.create(
-                        session, 
-                        chat_id, 
+                        session,
+                        chat_id,
                         group="",  # Пустая группа, будет установлена через /add
                         thread_id=thread_id
                     )
-                    await session.commit()
+                    registration_cache.known_chats.add(chat_id)
                     logger.info(f"Auto-registered chat {chat_id}")
-            
+
             # Для личных чатов - регистрируем пользователя
             elif event.chat.type == 'private':
-                user = await UserRepository.get_by_id(session, user_id)
-                if not user:
+                if user_id not in registration_cache.known_users:
                     # Создаем пользователя без группы
                     await UserRepository.create(
                         session,
                         user_id=user_id,
                         group="",  # Пустая группа, будет установлена через /add
                         username=event.from_user.username,
-                        last_activity=datetime.now()
+                        last_activity=func.now()
                     )
-                    await session.commit()
+                    registration_cache.known_users.add(user_id)
                     logger.info(f"Auto-registered user {user_id}")
-                    
+
                     # Отслеживаем нового пользователя в бизнес-метриках
                     business_metrics_service.track_new_user()
                 else:
-                    # Обновляем время последней активности
+                    # Обновляем время последней активности (метку времени
+                    # генерирует сама БД - без создания datetime в Python)
                     await UserRepository.update(
                         session,
                         user_id,
-                        last_activity=datetime.now()
+                        last_activity=func.now()
                     )
-                    await session.commit()
-        
+
         except Exception as e:
             logger.error(f"Error in ChatRegistrationMiddleware: {e}")
             # Не прерываем обработку сообщения из-за ошибки регистрации
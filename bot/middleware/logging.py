@@ -18,23 +18,32 @@ class LoggingMiddleware(BaseMiddleware):
     ) -> Any:
         """Логирование события"""
         
-        # Определяем тип события
+        # Определяем тип события.
+        # lazy=True откладывает форматирование аргументов до момента,
+        # когда уровень INFO действительно включен у какого-либо sink
         if event.message:
             msg = event.message
             user = msg.from_user
             chat = msg.chat
-            
-            logger.info(
-                f"Message from {user.id} (@{user.username}) "
-                f"in chat {chat.id} ({chat.type}): {msg.text[:50] if msg.text else '[media]'}"
+
+            logger.opt(lazy=True).info(
+                "Message from {} (@{}) in chat {} ({}): {}",
+                lambda: user.id,
+                lambda: user.username,
+                lambda: chat.id,
+                lambda: chat.type,
+                lambda: msg.text[:50] if msg.text else '[media]'
             )
-        
+
         elif event.callback_query:
             query = event.callback_query
             user = query.from_user
-            
-            logger.info(
-                f"Callback from {user.id} (@{user.username}): {query.data}"
+
+            logger.opt(lazy=True).info(
+                "Callback from {} (@{}): {}",
+                lambda: user.id,
+                lambda: user.username,
+                lambda: query.data
             )
         
         # Выполняем обработчик
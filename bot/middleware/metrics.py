@@ -61,6 +61,12 @@ unique_users = Gauge(
 # Используем set для отслеживания уникальных пользователей
 _unique_user_ids = set()
 
+# Предсозданные label-children гистограммы - labels() не вызывается на каждый event
+_duration_by_type = {
+    'message': request_duration_seconds.labels(type='message'),
+    'callback': request_duration_seconds.labels(type='callback'),
+}
+
 
 class MetricsMiddleware(BaseMiddleware):
     """Middleware для сбора метрик"""
@@ -73,7 +79,9 @@ class MetricsMiddleware(BaseMiddleware):
     ) -> Any:
         """Сбор метрик для события"""
         
-        start_time = time.time()
+        # perf_counter быстрее time.time() и монотонен - скачки системных
+        # часов не искажают гистограмму длительностей
+        start_time = time.perf_counter()
         event_type = None
         status = 'success'
         
@@ -222,6 +230,6 @@ class MetricsMiddleware(BaseMiddleware):
         finally:
             # Записываем время обработки
             if event_type:
-                duration = time.time() - start_time
-                request_duration_seconds.labels(type=event_type).observe(duration)
+                duration = time.perf_counter() - start_time
+                _duration_by_type[event_type].observe(duration)
 
@@ -1,8 +1,9 @@
 """
 Middleware для rate limiting и защиты от спама
 """
+import time
 from typing import Callable, Dict, Any, Awaitable
-from datetime import datetime, timedelta
+from datetime import datetime
 from aiogram import BaseMiddleware
 from aiogram.types import Message
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,13 +12,27 @@ from config import settings, Constants
 from database.repository import BanRepository
 
 
+# Каждые N запросов вычищаем записи пользователей, вышедших из окна
+_PRUNE_INTERVAL = 4096
+
+# TTL кэша результатов проверки бана (секунды)
+_BAN_CACHE_TTL = 30.0
+
+
 class RateLimitMiddleware(BaseMiddleware):
     """Middleware для контроля частоты запросов"""
-    
+
     def __init__(self):
         super().__init__()
-        # Хранилище счетчиков запросов {user_id: [timestamp1, timestamp2, ...]}
-        self.user_requests: Dict[int, list] = {}
+        self._prune_counter = 0
+        # Скользящее окно из двух целочисленных счетчиков на пользователя:
+        # {user_id: (window_index, curr_count, prev_count)}
+        # вместо списка timestamp'ов - O(1) память и без пересборки списков
+        self.user_requests: Dict[int, tuple] = {}
+        # Кэш проверки бана: {user_id: (ban_until_ms | None, cached_at)}.
+        # Отрицательный результат тоже кэшируется - подавляющее большинство
+        # сообщений идет от незабаненных пользователей
+        self._ban_cache: Dict[int, tuple] = {}
     
     async def __call__(
         self,
@@ -28,52 +43,88 @@ class RateLimitMiddleware(BaseMiddleware):
         """Проверка rate limit перед обработкой сообщения"""
         user_id = event.from_user.id
         session: AsyncSession = data.get('session')
-        
-        # Проверяем наличие активного бана
+
+        # Один вызов time.time() на запрос - без datetime-арифметики
+        ts = time.time()
+
+        # Проверяем наличие активного бана (через кэш - БД опрашивается
+        # не чаще раза в _BAN_CACHE_TTL на пользователя)
         if session:
-            ban = await BanRepository.get_by_id(session, user_id)
-            if ban and ban.ban_until > int(datetime.now().timestamp() * 1000):
+            cached = self._ban_cache.get(user_id)
+            if cached is not None and ts - cached[1] < _BAN_CACHE_TTL:
+                ban_until_ms = cached[0]
+            else:
+                ban = await BanRepository.get_by_id(session, user_id)
+                if ban and ban.ban_until <= int(ts * 1000):
+                    # Бан истек, удаляем
+                    await BanRepository.delete(session, user_id)
+                    ban = None
+                ban_until_ms = ban.ban_until if ban else None
+                self._ban_cache[user_id] = (ban_until_ms, ts)
+
+            if ban_until_ms is not None and ban_until_ms > int(ts * 1000):
                 # Пользователь забанен
-                ban_until_dt = datetime.fromtimestamp(ban.ban_until / 1000)
+                ban_until_dt = datetime.fromtimestamp(ban_until_ms / 1000)
                 await event.answer(
                     f"🚫 Поли заметил слишком много сообщений подряд... "
                     f"Ты временно заблокирован до {ban_until_dt.strftime('%d.%m.%Y %H:%M')}. "
                     f"Дай системе передохнуть!"
                 )
                 return  # Не обрабатываем сообщение
-            elif ban:
-                # Бан истек, удаляем
-                await BanRepository.delete(session, user_id)
         
-        # Очищаем старые запросы (старше окна rate limit)
-        now = datetime.now()
-        window_start = now - timedelta(seconds=settings.rate_limit_window_seconds)
-        
-        if user_id in self.user_requests:
-            self.user_requests[user_id] = [
-                ts for ts in self.user_requests[user_id]
-                if ts > window_start
-            ]
+        # Оценка частоты по скользящему окну: взвешенная сумма счетчика
+        # прошлого и текущего фиксированного под-окна
+        window = settings.rate_limit_window_seconds
+        window_index = int(ts // window)
+        elapsed = ts % window
+
+        entry = self.user_requests.get(user_id)
+        if entry is None or entry[0] < window_index - 1:
+            curr, prev = 0, 0
+        elif entry[0] == window_index:
+            curr, prev = entry[1], entry[2]
         else:
-            self.user_requests[user_id] = []
-        
-        # Добавляем текущий запрос
-        self.user_requests[user_id].append(now)
-        
-        # Проверяем лимит
-        if len(self.user_requests[user_id]) > settings.rate_limit_messages:
+            # Началось новое под-окно - текущий счетчик становится прошлым
+            curr, prev = 0, entry[1]
+
+        estimate = prev * (1 - elapsed / window) + curr
+
+        # Проверяем лимит (счетчик не увеличиваем, если лимит уже превышен)
+        if estimate >= settings.rate_limit_messages:
             # Превышен лимит - баним пользователя
             if session:
                 ban_until = int(
-                    (now + timedelta(minutes=settings.ban_duration_minutes)).timestamp() * 1000
+                    (ts + settings.ban_duration_minutes * 60) * 1000
                 )
                 await BanRepository.create(session, user_id, ban_until)
                 await session.commit()
+                self._ban_cache[user_id] = (ban_until, ts)
             
             await event.answer(
                 "🚫️ Поли заметил спам... Ты временно заблокирован. Попробуй чуть позже!"
             )
             return
-        
+
+        # Учитываем текущий запрос
+        self.user_requests[user_id] = (window_index, curr + 1, prev)
+
+        # Амортизированная уборка: иначе словарь растет навсегда
+        # по одному entry на каждого когда-либо писавшего пользователя
+        self._prune_counter += 1
+        if self._prune_counter >= _PRUNE_INTERVAL:
+            self._prune_counter = 0
+            stale = [
+                uid for uid, entry in self.user_requests.items()
+                if entry[0] < window_index - 1
+            ]
+            for uid in stale:
+                del self.user_requests[uid]
+            expired = [
+                uid for uid, entry in self._ban_cache.items()
+                if ts - entry[1] >= _BAN_CACHE_TTL
+            ]
+            for uid in expired:
+                del self._ban_cache[uid]
+
         # Продолжаем обработку
         return await handler(event, data)
@@ -2,7 +2,12 @@
 API клиент для работы с Raspyx API
 Управляет аутентификацией и предоставляет базовые методы для запросов
 """
+import asyncio
+import base64
+import json
+import random
 import httpx
+import orjson
 import time
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
@@ -10,6 +15,40 @@ from loguru import logger
 
 from config import settings
 
+# Retry-политика для временных ошибок (timeout, 5xx)
+_MAX_ATTEMPTS = 3
+# Сколько секунд fast-fail'ить endpoint после исчерпания ретраев
+_CIRCUIT_OPEN_SECONDS = 30.0
+
+
+def _token_expiry(token: str) -> Optional[datetime]:
+    """
+    Извлечь срок действия из exp-claim JWT токена
+
+    Args:
+        token: JWT токен
+
+    Returns:
+        Момент истечения (с запасом в минуту) или None, если распарсить не удалось
+    """
+    try:
+        payload_b64 = token.split(".")[1]
+        # base64url без паддинга - дополняем до кратности 4
+        payload_b64 += "=" * (-len(payload_b64) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(payload_b64))
+        exp = payload.get("exp")
+        if exp:
+            return datetime.fromtimestamp(int(exp)) - timedelta(seconds=60)
+    except Exception:
+        pass
+    return None
+
+
+# Маркер ответа 404: позволяет отличить "ресурса нет" от временной
+# ошибки API (таймаут, 5xx, открытый circuit breaker), когда оба случая
+# нельзя схлопывать в None
+NOT_FOUND = object()
+
 
 class RaspyxAPIClient:
     """Клиент для работы с Raspyx API с автоматической авторизацией"""
@@ -25,7 +64,36 @@ class RaspyxAPIClient:
         self.jwt_token: Optional[str] = None
         self.token_expires_at: Optional[datetime] = None
         self._client: Optional[httpx.AsyncClient] = None
-    
+        # Single-flight: при истечении токена под нагрузкой авторизуется
+        # только один вызов, остальные ждут результата
+        self._auth_lock = asyncio.Lock()
+        # Простой circuit breaker: {endpoint: monotonic-время, до которого
+        # запросы к нему не отправляются}
+        self._endpoint_down_until: Dict[str, float] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Получить переиспользуемый HTTP клиент
+
+        Один AsyncClient на процесс: соединения держатся keep-alive,
+        TLS-рукопожатие не повторяется на каждый запрос.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(
+                    max_connections=20,
+                    max_keepalive_connections=10
+                )
+            )
+        return self._client
+
+    async def close(self):
+        """Закрыть HTTP клиент и его пул соединений"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+
+
     async def authenticate(self) -> bool:
         """
         Авторизация в API и получение JWT токена
@@ -40,32 +108,37 @@ class RaspyxAPIClient:
         url = f"{self.base_url}/api/v1/users/login"
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                data = {
-                    "username": settings.api_username,
-                    "password": settings.api_password
-                }
-                
-                response = await client.post(url, json=data)
-                response.raise_for_status()
-                
-                result = response.json()
-                
-                # Получаем токен из ответа
-                if result.get("status") == "OK" and "response" in result:
-                    token_data = result["response"]
-                    # Предполагаем что токен возвращается в поле token или access_token
-                    self.jwt_token = token_data.get("token") or token_data.get("access_token")
-                    
-                    if self.jwt_token:
-                        # Устанавливаем срок действия токена (обычно 24 часа)
-                        self.token_expires_at = datetime.now() + timedelta(hours=23)
-                        logger.info("Successfully authenticated with Raspyx API")
-                        return True
-                
-                logger.error("Invalid response format during authentication")
-                return False
-                
+            client = self._get_client()
+            data = {
+                "username": settings.api_username,
+                "password": settings.api_password
+            }
+
+            response = await client.post(url, json=data)
+            response.raise_for_status()
+
+            result = orjson.loads(response.content)
+
+            # Получаем токен из ответа
+            if result.get("status") == "OK" and "response" in result:
+                token_data = result["response"]
+                # Предполагаем что токен возвращается в поле token или access_token
+                self.jwt_token = token_data.get("token") or token_data.get("access_token")
+
+                if self.jwt_token:
+                    # Срок действия берем из exp-claim самого токена;
+                    # 23 часа - только fallback, если claim не распарсился
+                    self.token_expires_at = (
+                        _token_expiry(self.jwt_token)
+                        or datetime.now() + timedelta(hours=23)
+                    )
+                    logger.info("Successfully authenticated with Raspyx API")
+                    return True
+
+            logger.error("Invalid response format during authentication")
+            return False
+
+
         except httpx.HTTPStatusError as e:
             logger.error(f"Authentication failed: HTTP {e.response.status_code}")
             return False
@@ -87,9 +160,15 @@ class RaspyxAPIClient:
         if self.jwt_token and self.token_expires_at:
             if datetime.now() < self.token_expires_at:
                 return True
-        
-        # Токена нет или он истек - авторизуемся заново
-        return await self.authenticate()
+
+        # Токена нет или он истек - авторизуемся заново.
+        # Double-checked locking: пока мы ждали lock, другой вызов
+        # мог уже получить свежий токен
+        async with self._auth_lock:
+            if self.jwt_token and self.token_expires_at:
+                if datetime.now() < self.token_expires_at:
+                    return True
+            return await self.authenticate()
     
     def get_auth_headers(self) -> Dict[str, str]:
         """
@@ -112,34 +191,53 @@ class RaspyxAPIClient:
         method: str,
         endpoint: str,
         params: Optional[Dict[str, Any]] = None,
-        json_data: Optional[Dict[str, Any]] = None,
-        retry_auth: bool = True
+        json_data: Optional[Dict[str, Any]] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Выполнить HTTP запрос к API с автоматической авторизацией
-        
+
+        При 401 запрос повторяется один раз после переавторизации.
+
         Args:
             method: HTTP метод (GET, POST, PUT, DELETE)
             endpoint: Endpoint API (без базового URL)
             params: Query параметры
             json_data: JSON данные для POST/PUT запросов
-            retry_auth: Повторить запрос после авторизации при 401
-            
+
         Returns:
             Данные ответа или None
         """
-        # Убедимся что авторизованы
-        if not await self.ensure_authenticated():
-            logger.error("Failed to authenticate before request")
-            return None
-        
+        # Убедимся что авторизованы. Быстрый путь инлайнится - при живом
+        # токене не платим за лишнюю coroutine-приостановку на каждый вызов
+        if not (
+            self.jwt_token
+            and self.token_expires_at
+            and datetime.now() < self.token_expires_at
+        ):
+            if not await self.ensure_authenticated():
+                logger.error("Failed to authenticate before request")
+                return None
+
+        # Circuit breaker: недавно упавший endpoint fast-fail'ится,
+        # чтобы не усиливать деградацию upstream'а повторами
+        down_until = self._endpoint_down_until.get(endpoint)
+        if down_until is not None:
+            if time.monotonic() < down_until:
+                logger.warning(f"API circuit open {endpoint} - skipping request")
+                return None
+            del self._endpoint_down_until[endpoint]
+
         url = f"{self.base_url}{endpoint}"
-        start_time = time.time()
-        
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+
+        # Итеративный retry вместо рекурсивного вызова request();
+        # временные ошибки повторяются с экспоненциальным backoff+jitter
+        for attempt in range(_MAX_ATTEMPTS):
+            start_time = time.time()
+
+            try:
+                client = self._get_client()
                 headers = self.get_auth_headers()
-                
+
                 response = await client.request(
                     method=method,
                     url=url,
@@ -147,44 +245,62 @@ class RaspyxAPIClient:
                     params=params,
                     json=json_data
                 )
-                
+
                 elapsed_time = time.time() - start_time
                 logger.info(f"API {method} {endpoint} - {response.status_code} ({elapsed_time:.2f}s)")
-                
+
                 response.raise_for_status()
-                
-                result = response.json()
-                
+
+                # orjson заметно быстрее stdlib json на KB-MB payload'ах
+                result = orjson.loads(response.content)
+
                 # Проверяем формат ответа согласно спецификации
                 if result.get("status") == "OK" and "response" in result:
                     return result["response"]
-                
+
                 logger.error(f"Invalid response format from {endpoint}")
                 return None
-                
-        except httpx.HTTPStatusError as e:
-            elapsed_time = time.time() - start_time
-            
-            if e.response.status_code == 401 and retry_auth:
-                logger.warning(f"API 401 {endpoint} - re-authenticating")
-                # Пытаемся авторизоваться и повторить запрос
-                if await self.authenticate():
-                    return await self.request(
-                        method, endpoint, params, json_data, retry_auth=False
+
+            except httpx.HTTPStatusError as e:
+                elapsed_time = time.time() - start_time
+
+                if e.response.status_code == 401 and attempt == 0:
+                    logger.warning(f"API 401 {endpoint} - re-authenticating")
+                    # Сбрасываем отклоненный токен и идем через single-flight
+                    # lock - конкурентные 401 сведутся к одной авторизации
+                    self.jwt_token = None
+                    if await self.ensure_authenticated():
+                        continue
+                elif e.response.status_code == 404:
+                    logger.warning(f"API 404 {endpoint}")
+                    return NOT_FOUND
+                elif 500 <= e.response.status_code < 600:
+                    logger.error(f"API {e.response.status_code} {endpoint} ({elapsed_time:.2f}s)")
+                    if attempt < _MAX_ATTEMPTS - 1:
+                        await asyncio.sleep(2 ** attempt * random.random())
+                        continue
+                    self._endpoint_down_until[endpoint] = (
+                        time.monotonic() + _CIRCUIT_OPEN_SECONDS
                     )
-            elif e.response.status_code == 404:
-                logger.warning(f"API 404 {endpoint}")
-            else:
-                logger.error(f"API {e.response.status_code} {endpoint} ({elapsed_time:.2f}s)")
-            return None
-        except httpx.TimeoutException:
-            elapsed_time = time.time() - start_time
-            logger.error(f"API timeout {endpoint} ({elapsed_time:.2f}s)")
-            return None
-        except Exception as e:
-            elapsed_time = time.time() - start_time
-            logger.error(f"API error {endpoint}: {e} ({elapsed_time:.2f}s)")
-            return None
+                else:
+                    logger.error(f"API {e.response.status_code} {endpoint} ({elapsed_time:.2f}s)")
+                return None
+            except httpx.TimeoutException:
+                elapsed_time = time.time() - start_time
+                logger.error(f"API timeout {endpoint} ({elapsed_time:.2f}s)")
+                if attempt < _MAX_ATTEMPTS - 1:
+                    await asyncio.sleep(2 ** attempt * random.random())
+                    continue
+                self._endpoint_down_until[endpoint] = (
+                    time.monotonic() + _CIRCUIT_OPEN_SECONDS
+                )
+                return None
+            except Exception as e:
+                elapsed_time = time.time() - start_time
+                logger.error(f"API error {endpoint}: {e} ({elapsed_time:.2f}s)")
+                return None
+
+        return None
     
     async def get(
         self,
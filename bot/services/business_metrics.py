@@ -2,15 +2,17 @@
 Сервис для сбора бизнес-метрик
 """
 import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Set, Dict
+from typing import Dict
 from collections import defaultdict
 from loguru import logger
 from prometheus_client import Gauge, Counter, Histogram
 
 from database.session import db_session
 from database.models import User, Chat, FeedbackMessage, BlockedUser
-from sqlalchemy import select, func, and_, or_
+from bot.utils.hyperloglog import HyperLogLog
+from sqlalchemy import select, func, and_, or_, bindparam
 
 
 # ===== БИЗНЕС-МЕТРИКИ =====
@@ -82,49 +84,145 @@ group_selection_rate = Gauge('bot_group_selection_rate', 'Users who selected a g
 active_users_by_hour = Gauge('bot_active_users_by_hour', 'Active users by hour', ['hour'])
 
 
+# ===== Предсобранные запросы метрик =====
+# Statement'ы строятся один раз на импорт модуля с bindparam'ами для
+# cutoff'ов - фоновый цикл не пересобирает дерево выражений каждый тик,
+# а компиляция стабильно попадает в кэш SQLAlchemy
+
+# Все счетчики по users одним запросом через условную агрегацию
+# (COUNT ... FILTER) вместо ~10 последовательных round trip'ов
+_USER_COUNTS_STMT = select(
+    func.count(User.userid).label('total'),
+    func.count(User.userid).filter(
+        User.tutorial_completed == True
+    ).label('tutorial_completed'),
+    func.count(User.userid).filter(
+        User.group != ""
+    ).label('selected_group'),
+    func.count(User.userid).filter(
+        User.daily_notify_enabled == True
+    ).label('daily_notify'),
+    func.count(User.userid).filter(
+        User.notify_online == True
+    ).label('online_notify'),
+    func.count(User.userid).filter(
+        User.created_at >= bindparam('today_start')
+    ).label('new_today'),
+    # Неактивны 7+/30+ дней (по last_activity или
+    # created_at если last_activity пустое)
+    func.count(User.userid).filter(
+        or_(
+            and_(User.last_activity.is_not(None), User.last_activity < bindparam('week_ago')),
+            and_(User.last_activity.is_(None), User.created_at < bindparam('week_ago'))
+        )
+    ).label('inactive_7d'),
+    func.count(User.userid).filter(
+        or_(
+            and_(User.last_activity.is_not(None), User.last_activity < bindparam('month_ago')),
+            and_(User.last_activity.is_(None), User.created_at < bindparam('month_ago'))
+        )
+    ).label('inactive_30d'),
+    # Retention: активные за последние 24 часа / 7 дней
+    func.count(User.userid).filter(
+        User.last_activity >= bindparam('day_ago')
+    ).label('returning_daily'),
+    func.count(User.userid).filter(
+        User.last_activity >= bindparam('week_ago')
+    ).label('returning_weekly'),
+)
+
+_CHAT_COUNT_STMT = select(func.count(Chat.chatid))
+
+_BLOCKED_COUNT_STMT = select(func.count(BlockedUser.userid))
+
+_FEEDBACK_COUNT_STMT = select(func.count(FeedbackMessage.id)).where(
+    FeedbackMessage.timestamp >= bindparam('day_ago')
+)
+
+_TOP_GROUPS_STMT = (
+    select(User.group, func.count(User.userid))
+    .where(User.group != "")
+    .group_by(User.group)
+    .order_by(func.count(User.userid).desc())
+    .limit(20)  # Топ 20 групп
+)
+
+
 class BusinessMetricsService:
     """Сервис для вычисления и обновления бизнес-метрик"""
     
     def __init__(self):
-        self.active_users_24h: Set[int] = set()
-        self.active_users_7d: Set[int] = set()
-        self.active_users_30d: Set[int] = set()
+        # HyperLogLog вместо set[int]: нужны только len(), а память
+        # фиксированная (~KB на счетчик) при погрешности ~1%
+        self.active_users_24h = HyperLogLog(0.01)
+        self.active_users_7d = HyperLogLog(0.01)
+        self.active_users_30d = HyperLogLog(0.01)
         
         # Счетчики для текущей сессии
         self.user_message_counts: Dict[int, int] = defaultdict(int)
         self.user_command_counts: Dict[int, int] = defaultdict(int)
-        self.last_user_activity: Dict[int, datetime] = {}
         
-        # Для отслеживания активности по часам
-        self.users_by_hour: Dict[int, Set[int]] = defaultdict(set)
+        # Для отслеживания активности по часам - тоже только len(),
+        # поэтому HyperLogLog вместо 24 растущих set'ов
+        self.users_by_hour: Dict[int, HyperLogLog] = defaultdict(
+            lambda: HyperLogLog(0.01)
+        )
         
+        # Снапшот топ-групп: (monotonic ts, rows) - состав групп меняется
+        # медленно, запрос с GROUP BY гоняем не чаще раза в 10 минут
+        self._top_groups_cache = None
+
+        # События активности складываются в очередь и сворачиваются пачками
+        # в фоне - хендлер не платит за labels()/lock prometheus_client
+        self._events: asyncio.Queue = asyncio.Queue(maxsize=10000)
+
         self.running = False
         self.update_task = None
-    
+        self._drain_task = None
+
     def track_user_activity(self, user_id: int, is_command: bool = False, chat_type: str = 'private'):
         """Отслеживание активности пользователя"""
-        now = datetime.now()
-        
-        # Добавляем в активные
-        self.active_users_24h.add(user_id)
-        self.active_users_7d.add(user_id)
-        self.active_users_30d.add(user_id)
-        
-        # Обновляем время последней активности
-        self.last_user_activity[user_id] = now
-        
-        # Счетчики сообщений/команд
-        self.user_message_counts[user_id] += 1
-        if is_command:
-            self.user_command_counts[user_id] += 1
-        
-        # Активность по часам
-        hour = now.hour
-        self.users_by_hour[hour].add(user_id)
-        
-        # Сессии
-        user_sessions.labels(chat_type=chat_type).inc()
-    
+        # Только put_nowait на hot path; при переполнении очереди
+        # событие отбрасывается - метрики приближенные, потеря допустима
+        try:
+            self._events.put_nowait((user_id, is_command, chat_type))
+        except asyncio.QueueFull:
+            pass
+
+    async def _drain_events(self):
+        """Фоновая свертка событий активности пачками до 1000 штук"""
+        while self.running:
+            try:
+                batch = [await self._events.get()]
+                while len(batch) < 1000:
+                    try:
+                        batch.append(self._events.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+
+                hour = datetime.now().hour
+                session_counts: Dict[str, int] = {}
+                for user_id, is_command, chat_type in batch:
+                    self.active_users_24h.add(user_id)
+                    self.active_users_7d.add(user_id)
+                    self.active_users_30d.add(user_id)
+
+                    self.user_message_counts[user_id] += 1
+                    if is_command:
+                        self.user_command_counts[user_id] += 1
+
+                    self.users_by_hour[hour].add(user_id)
+                    session_counts[chat_type] = session_counts.get(chat_type, 0) + 1
+
+                # Один inc(n) на тип чата вместо inc() на каждое событие
+                for chat_type, n in session_counts.items():
+                    user_sessions.labels(chat_type=chat_type).inc(n)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error draining activity events: {e}", exc_info=True)
+
     def track_feature_usage(self, feature_name: str):
         """Отслеживание использования функций"""
         feature_usage.labels(feature=feature_name).inc()
@@ -137,149 +235,117 @@ class BusinessMetricsService:
         """Отслеживание обратной связи"""
         feedback_messages_total.inc()
     
-    async def update_db_metrics(self):
+    async def _collect_user_counts(self, today_start, day_ago, week_ago, month_ago):
+        """Счетчики по таблице users одним агрегированным запросом"""
+        async with db_session.async_session_maker() as session:
+            return (await session.execute(
+                _USER_COUNTS_STMT,
+                {
+                    'today_start': today_start,
+                    'day_ago': day_ago,
+                    'week_ago': week_ago,
+                    'month_ago': month_ago,
+                }
+            )).one()
+
+    async def _collect_chat_count(self):
+        """Общее число групповых чатов"""
+        async with db_session.async_session_maker() as session:
+            return await session.scalar(_CHAT_COUNT_STMT)
+
+    async def _collect_blocked_count(self):
+        """Число заблокировавших бота"""
+        async with db_session.async_session_maker() as session:
+            return await session.scalar(_BLOCKED_COUNT_STMT)
+
+    async def _collect_feedback_count(self, day_ago):
+        """Число фидбеков за последние 24 часа"""
+        async with db_session.async_session_maker() as session:
+            return await session.scalar(
+                _FEEDBACK_COUNT_STMT, {'day_ago': day_ago}
+            )
+
+    async def _collect_top_groups(self):
+        """Топ-20 групп по количеству пользователей"""
+        async with db_session.async_session_maker() as session:
+            result = await session.execute(_TOP_GROUPS_STMT)
+            return result.fetchall()
+
+    async def update_db_metrics(self, now: datetime = None):
         """Обновление метрик из базы данных"""
         try:
-            async for session in db_session.get_session():
-                # === Общие метрики ===
-                
-                # Всего пользователей
-                total_users = await session.scalar(select(func.count(User.userid)))
-                total_private_chats.set(total_users or 0)
-                
-                # Всего групповых чатов
-                total_chats = await session.scalar(select(func.count(Chat.chatid)))
-                total_group_chats.set(total_chats or 0)
-                
-                # === Конверсия ===
-                
-                # Tutorial completion rate
-                if total_users and total_users > 0:
-                    completed_tutorial = await session.scalar(
-                        select(func.count(User.userid)).where(User.tutorial_completed == True)
-                    )
-                    tutorial_completion_rate.set(
-                        (completed_tutorial / total_users * 100) if completed_tutorial else 0
-                    )
-                    
-                    # Group selection rate
-                    selected_group = await session.scalar(
-                        select(func.count(User.userid)).where(User.group != "")
-                    )
-                    group_selection_rate.set(
-                        (selected_group / total_users * 100) if selected_group else 0
-                    )
-                
-                # === Подписчики уведомлений ===
-                
-                daily_notify_users = await session.scalar(
-                    select(func.count(User.userid)).where(User.daily_notify_enabled == True)
-                )
-                notification_subscribers.labels(type='daily').set(daily_notify_users or 0)
-                
-                online_notify_users = await session.scalar(
-                    select(func.count(User.userid)).where(User.notify_online == True)
-                )
-                notification_subscribers.labels(type='online').set(online_notify_users or 0)
-                
-                # === Новые пользователи сегодня ===
-                
-                today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                new_today = await session.scalar(
-                    select(func.count(User.userid)).where(User.created_at >= today_start)
-                )
-                new_users_today.set(new_today or 0)
-                
-                # === Churn метрики ===
-                
-                # Заблокировавшие бота
-                blocked_count = await session.scalar(select(func.count(BlockedUser.userid)))
-                blocked_bot_users.set(blocked_count or 0)
-                
-                # Неактивные пользователи (используем last_activity если доступно)
+            # Метка времени тика вычисляется один раз в update_loop
+            # и переиспользуется всеми производными cutoff'ами
+            if now is None:
                 now = datetime.now()
-                week_ago = now - timedelta(days=7)
-                month_ago = now - timedelta(days=30)
-                
-                # Неактивны 7+ дней (по last_activity или created_at если last_activity пустое)
-                inactive_7d_count = await session.scalar(
-                    select(func.count(User.userid)).where(
-                        or_(
-                            and_(User.last_activity.is_not(None), User.last_activity < week_ago),
-                            and_(User.last_activity.is_(None), User.created_at < week_ago)
-                        )
-                    )
-                )
-                inactive_users_7d.set(inactive_7d_count or 0)
-                
-                # Неактивны 30+ дней
-                inactive_30d_count = await session.scalar(
-                    select(func.count(User.userid)).where(
-                        or_(
-                            and_(User.last_activity.is_not(None), User.last_activity < month_ago),
-                            and_(User.last_activity.is_(None), User.created_at < month_ago)
-                        )
-                    )
-                )
-                inactive_users_30d.set(inactive_30d_count or 0)
-                
-                # === Retention метрики (улучшенные с last_activity) ===
-                
-                # Пользователи, которые были активны вчера и вернулись сегодня
-                yesterday_start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
-                yesterday_end = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                today_start = yesterday_end
-                
-                # Это требует более сложного запроса с подзапросами
-                # Упрощенная версия: пользователи активные за последние 24 часа
-                day_ago = now - timedelta(days=1)
-                returning_daily_count = await session.scalar(
-                    select(func.count(User.userid)).where(
-                        and_(
-                            User.last_activity.is_not(None),
-                            User.last_activity >= day_ago
-                        )
-                    )
-                )
-                returning_users_daily.set(returning_daily_count or 0)
-                
-                # Пользователи активные за последние 7 дней
-                returning_weekly_count = await session.scalar(
-                    select(func.count(User.userid)).where(
-                        and_(
-                            User.last_activity.is_not(None),
-                            User.last_activity >= week_ago
-                        )
-                    )
+            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            day_ago = now - timedelta(days=1)
+            week_ago = now - timedelta(days=7)
+            month_ago = now - timedelta(days=30)
+
+            # Топ-группы пересчитываем не чаще раза в 10 минут,
+            # между пересчетами публикуем прошлый снапшот
+            refresh_groups = (
+                self._top_groups_cache is None
+                or time.monotonic() - self._top_groups_cache[0] >= 600
+            )
+
+            # Запросы к разным таблицам независимы - выполняем их
+            # параллельно, каждый в своей сессии (цикл фоновый и ходит
+            # в БД раз в минуту, так что всплеск по пулу незначителен)
+            tasks = [
+                self._collect_user_counts(today_start, day_ago, week_ago, month_ago),
+                self._collect_chat_count(),
+                self._collect_blocked_count(),
+                self._collect_feedback_count(day_ago),
+            ]
+            if refresh_groups:
+                tasks.append(self._collect_top_groups())
+
+            results = await asyncio.gather(*tasks)
+            user_counts, total_chats, blocked_count, feedback_count = results[:4]
+
+            if refresh_groups:
+                self._top_groups_cache = (time.monotonic(), results[4])
+            top_groups = self._top_groups_cache[1]
+
+            total_users = user_counts.total or 0
+            total_private_chats.set(total_users)
+
+            # === Конверсия ===
+            if total_users > 0:
+                tutorial_completion_rate.set(
+                    user_counts.tutorial_completed / total_users * 100
                 )
-                returning_users_weekly.set(returning_weekly_count or 0)
-                
-                # === Feedback метрики ===
-                
-                # Feedback за последние 24 часа
-                day_ago = datetime.now() - timedelta(days=1)
-                feedback_count = await session.scalar(
-                    select(func.count(FeedbackMessage.id)).where(
-                        FeedbackMessage.timestamp >= day_ago
-                    )
+                group_selection_rate.set(
+                    user_counts.selected_group / total_users * 100
                 )
-                feedback_daily.set(feedback_count or 0)
-                
-                # === Группы по типам ===
-                
-                # Топ групп по количеству пользователей
-                result = await session.execute(
-                    select(User.group, func.count(User.userid))
-                    .where(User.group != "")
-                    .group_by(User.group)
-                    .order_by(func.count(User.userid).desc())
-                    .limit(20)  # Топ 20 групп
-                )
-                
-                for group_name, count in result.fetchall():
-                    if group_name:
-                        groups_by_type.labels(group_name=group_name).set(count)
-                
+
+            # === Подписчики уведомлений ===
+            notification_subscribers.labels(type='daily').set(user_counts.daily_notify)
+            notification_subscribers.labels(type='online').set(user_counts.online_notify)
+
+            # === Новые пользователи сегодня ===
+            new_users_today.set(user_counts.new_today)
+
+            # === Churn метрики ===
+            inactive_users_7d.set(user_counts.inactive_7d)
+            inactive_users_30d.set(user_counts.inactive_30d)
+
+            # === Retention метрики ===
+            returning_users_daily.set(user_counts.returning_daily)
+            returning_users_weekly.set(user_counts.returning_weekly)
+
+            # === Остальные таблицы ===
+            total_group_chats.set(total_chats or 0)
+            blocked_bot_users.set(blocked_count or 0)
+            feedback_daily.set(feedback_count or 0)
+
+            # === Группы по типам ===
+            for group_name, count in top_groups:
+                if group_name:
+                    groups_by_type.labels(group_name=group_name).set(count)
+
         except Exception as e:
             logger.error(f"Error updating DB metrics: {e}", exc_info=True)
     
@@ -291,14 +357,10 @@ class BusinessMetricsService:
             wau_gauge.set(len(self.active_users_7d))
             mau_gauge.set(len(self.active_users_30d))
             
-            # Messages per user (обновляем гистограмму)
-            for user_id, count in self.user_message_counts.items():
-                messages_per_user.observe(count)
-            
-            # Commands per user
-            for user_id, count in self.user_command_counts.items():
-                commands_per_user.observe(count)
-            
+            # Messages/commands per user наблюдаются один раз за сутки
+            # в cleanup_old_data - ежеминутный повтор observe по всем
+            # пользователям искажал гистограмму и стоил O(users) за тик
+
             # Active users by hour
             for hour, users in self.users_by_hour.items():
                 active_users_by_hour.labels(hour=str(hour).zfill(2)).set(len(users))
@@ -309,10 +371,11 @@ class BusinessMetricsService:
         except Exception as e:
             logger.error(f"Error updating runtime metrics: {e}", exc_info=True)
     
-    async def cleanup_old_data(self):
+    async def cleanup_old_data(self, now: datetime = None):
         """Очистка старых данных для экономии памяти"""
         try:
-            now = datetime.now()
+            if now is None:
+                now = datetime.now()
             
             # Очищаем активных пользователей по периодам
             # (в реальности нужно проверять реальное время активности)
@@ -320,6 +383,13 @@ class BusinessMetricsService:
             
             # Очищаем счетчики сообщений раз в сутки
             if now.hour == 0 and now.minute < 10:
+                # Суточные распределения попадают в гистограммы один раз -
+                # по завершении суток, перед сбросом счетчиков
+                for count in self.user_message_counts.values():
+                    messages_per_user.observe(count)
+                for count in self.user_command_counts.values():
+                    commands_per_user.observe(count)
+
                 self.user_message_counts.clear()
                 self.user_command_counts.clear()
                 self.users_by_hour.clear()
@@ -334,14 +404,17 @@ class BusinessMetricsService:
         
         while self.running:
             try:
-                # Обновляем метрики из БД (раз в 5 минут)
-                await self.update_db_metrics()
-                
+                # Одна метка времени на весь тик
+                now = datetime.now()
+
+                # Обновляем метрики из БД
+                await self.update_db_metrics(now)
+
                 # Обновляем runtime метрики (каждую минуту)
                 await self.update_runtime_metrics()
-                
+
                 # Очистка старых данных
-                await self.cleanup_old_data()
+                await self.cleanup_old_data(now)
                 
                 # Спим 1 минуту
                 await asyncio.sleep(60)
@@ -359,18 +432,20 @@ class BusinessMetricsService:
         if not self.running:
             self.running = True
             self.update_task = asyncio.create_task(self.update_loop())
+            self._drain_task = asyncio.create_task(self._drain_events())
             logger.info("Business metrics service starting...")
-    
+
     async def stop(self):
         """Остановка сервиса"""
         if self.running:
             self.running = False
-            if self.update_task:
-                self.update_task.cancel()
-                try:
-                    await self.update_task
-                except asyncio.CancelledError:
-                    pass
+            for task in (self.update_task, self._drain_task):
+                if task:
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
             logger.info("Business metrics service stopped")
 
 
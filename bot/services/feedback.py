@@ -1,25 +1,59 @@
 """
 Сервис для работы с обратной связью
 """
-import json
+import asyncio
+import time
 from typing import Optional, List
 from aiogram import Bot
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
-from database.repository import FeedbackRepository, UserRepository
+from database.repository import FeedbackRepository
 from bot.utils import build_pagination_keyboard, escape_html
 from bot.services.business_metrics import business_metrics_service
 
+# Сколько секунд страница списка живет в кэше
+_PAGE_CACHE_TTL = 30.0
+
+# Кэш страниц списка: {(page, page_size): (monotonic ts, (rows, total))}.
+# Модульный, как _MEDIA_SENDERS: хендлеры создают FeedbackService на
+# каждый апдейт, поэтому кэш на инстансе не пережил бы и одного
+# переключения страницы. Фидбеки append-mostly - повторные рендеры
+# клавиатуры не ходят в БД; сбрасывается при create/delete
+_page_cache: dict = {}
+
+# Диспатч по типу медиа: {тип: (метод бота, извлечение file_id)}.
+# Один словарь вместо дублирующихся if/elif лестниц в путях отправки
+_MEDIA_SENDERS = {
+    'photo': ('send_photo', lambda m: m.photo[-1].file_id),
+    'video': ('send_video', lambda m: m.video.file_id),
+    'document': ('send_document', lambda m: m.document.file_id),
+    'audio': ('send_audio', lambda m: m.audio.file_id),
+    'voice': ('send_voice', lambda m: m.voice.file_id),
+    'video_note': ('send_video_note', lambda m: m.video_note.file_id),
+}
+
+# Типы, которые Bot API умеет отправлять с caption
+# (video_note подпись не поддерживает - уходит текстом)
+_CAPTIONABLE = frozenset(('photo', 'video', 'document', 'audio', 'voice'))
+
+
+def _detect_media(message: Message):
+    """Определить тип медиа и file_id сообщения (None, None если текст)"""
+    for media_type, (_, getter) in _MEDIA_SENDERS.items():
+        if getattr(message, media_type, None):
+            return media_type, getter(message)
+    return None, None
+
 
 class FeedbackService:
     """Сервис для обработки обратной связи"""
-    
+
     def __init__(self, bot: Bot):
         self.bot = bot
         self.feedback_pagination_data = {}  # {message_id: {data}}
-    
+
     async def create_feedback(
         self,
         session: AsyncSession,
@@ -39,37 +73,26 @@ class FeedbackService:
         user_message_id = message.message_id
         text = message.text or message.caption
         
-        # Собираем информацию о медиа
-        media_ids = {}
-        if message.photo:
-            media_ids['photo'] = message.photo[-1].file_id
-        elif message.video:
-            media_ids['video'] = message.video.file_id
-        elif message.document:
-            media_ids['document'] = message.document.file_id
-        elif message.audio:
-            media_ids['audio'] = message.audio.file_id
-        elif message.voice:
-            media_ids['voice'] = message.voice.file_id
-        elif message.video_note:
-            media_ids['video_note'] = message.video_note.file_id
-        
-        media_json = json.dumps(media_ids) if media_ids else None
-        
+        # Определяем тип медиа - колонки типизированные,
+        # сериализация в JSON больше не нужна
+        media_type, media_file_id = _detect_media(message)
+
         # Создаем запись
         feedback = await FeedbackRepository.create(
             session,
             user_id=user_id,
             user_message_id=user_message_id,
-            media_ids=media_json,
+            media_type=media_type,
+            media_file_id=media_file_id,
             text=text
         )
         
         await session.commit()
-        
+        _page_cache.clear()
+
         # Отслеживаем в бизнес-метриках
         business_metrics_service.track_feedback()
-        
+
         return feedback.id
     
     async def get_feedbacks_list(
@@ -89,13 +112,20 @@ class FeedbackService:
         Returns:
             (список фидбеков, общее количество)
         """
-        all_feedbacks = await FeedbackRepository.get_all(session)
-        total = len(all_feedbacks)
-        
-        start_idx = page * page_size
-        end_idx = start_idx + page_size
-        
-        return all_feedbacks[start_idx:end_idx], total
+        cache_key = (page, page_size)
+        cached = _page_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < _PAGE_CACHE_TTL:
+            return cached[1]
+
+        # Пагинация на стороне БД: тянем только окно страницы и COUNT,
+        # а не всю таблицу на каждый просмотр
+        feedbacks = await FeedbackRepository.get_page(
+            session, page * page_size, page_size
+        )
+        total = await FeedbackRepository.count(session)
+
+        _page_cache[cache_key] = (time.monotonic(), (feedbacks, total))
+        return feedbacks, total
     
     def build_feedbacks_keyboard(
         self,
@@ -114,19 +144,16 @@ class FeedbackService:
         Returns:
             InlineKeyboardMarkup
         """
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        
-        builder = InlineKeyboardBuilder()
-        
-        # Кнопки для каждого фидбека
-        for fb in feedbacks:
-            builder.row(
-                InlineKeyboardButton(
-                    text=f"#{fb.id}",
-                    callback_data=f"ask_view_{fb.id}"
-                )
-            )
-        
+        # Собираем разметку напрямую, без InlineKeyboardBuilder -
+        # builder платит за управление рядами на каждую кнопку
+        rows = [
+            [InlineKeyboardButton(
+                text=f"#{fb.id}",
+                callback_data=f"ask_view_{fb.id}"
+            )]
+            for fb in feedbacks
+        ]
+
         # Навигация
         nav_buttons = []
         if current_page > 0:
@@ -143,11 +170,11 @@ class FeedbackService:
                     callback_data=f"fb_pg:{current_page + 1}"
                 )
             )
-        
+
         if nav_buttons:
-            builder.row(*nav_buttons)
-        
-        return builder.as_markup()
+            rows.append(nav_buttons)
+
+        return InlineKeyboardMarkup(inline_keyboard=rows)
     
     async def send_feedback_to_admins(
         self,
@@ -166,12 +193,11 @@ class FeedbackService:
         Returns:
             ID отправленного сообщения или None
         """
-        feedback = await FeedbackRepository.get_by_id(session, feedback_id)
+        # Фидбек и его автор одним JOIN-запросом вместо двух round trip'ов
+        feedback, user = await FeedbackRepository.get_with_user(session, feedback_id)
         if not feedback:
             return None
-        
-        # Получаем информацию о пользователе
-        user = await UserRepository.get_by_id(session, feedback.user_id)
+
         username = f"@{user.username}" if user and user.username else f"ID {feedback.user_id}"
         
         # Формируем текст
@@ -182,63 +208,38 @@ class FeedbackService:
             f"{feedback.text or '(пусто)'}"
         )
         
-        # Клавиатура с кнопкой "Ответить"
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        builder = InlineKeyboardBuilder()
-        builder.row(
+        # Клавиатура с кнопкой "Ответить" - одна кнопка, разметка напрямую
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[
             InlineKeyboardButton(
                 text="Ответить",
                 callback_data=f"ask_reply_{feedback.id}"
             )
-        )
-        keyboard = builder.as_markup()
-        
+        ]])
+
+        # Экранируем один раз до ветвления - текст одинаков для всех путей
+        escaped = escape_html(text)
+
         try:
-            # Если есть медиа - отправляем с медиа
-            if feedback.media_ids:
-                media = json.loads(feedback.media_ids)
-                
-                if 'photo' in media:
-                    msg = await self.bot.send_photo(
-                        admin_chat_id,
-                        photo=media['photo'],
-                        caption=escape_html(text),
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
-                elif 'video' in media:
-                    msg = await self.bot.send_video(
-                        admin_chat_id,
-                        video=media['video'],
-                        caption=escape_html(text),
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
-                elif 'document' in media:
-                    msg = await self.bot.send_document(
-                        admin_chat_id,
-                        document=media['document'],
-                        caption=escape_html(text),
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
-                else:
-                    # Остальные типы медиа или текст
-                    msg = await self.bot.send_message(
-                        admin_chat_id,
-                        text=escape_html(text),
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
+            # Если есть медиа - отправляем с медиа: тип лежит в отдельной
+            # колонке, диспатчим по словарю без парсинга JSON
+            if feedback.media_type in _CAPTIONABLE:
+                method, _ = _MEDIA_SENDERS[feedback.media_type]
+                msg = await getattr(self.bot, method)(
+                    admin_chat_id,
+                    feedback.media_file_id,
+                    caption=escaped,
+                    parse_mode='HTML',
+                    reply_markup=keyboard
+                )
             else:
-                # Только текст
+                # Остальные типы медиа или только текст
                 msg = await self.bot.send_message(
                     admin_chat_id,
-                    text=escape_html(text),
+                    text=escaped,
                     parse_mode='HTML',
                     reply_markup=keyboard
                 )
-            
+
             return msg.message_id
             
         except Exception as e:
@@ -275,70 +276,58 @@ class FeedbackService:
         text = reply_message.text or reply_message.caption or ""
         caption_text = f"Ответ на твой фидбек #{feedback_id} от {admin_tag}:\n\n{text}"
         
-        try:
-            # Пытаемся отправить с reply
-            reply_to = feedback.user_message_id
-            
-            if reply_message.photo:
-                await self.bot.send_photo(
-                    user_id,
-                    photo=reply_message.photo[-1].file_id,
-                    caption=caption_text,
-                    reply_to_message_id=reply_to
-                )
-            elif reply_message.video:
-                await self.bot.send_video(
-                    user_id,
-                    video=reply_message.video.file_id,
-                    caption=caption_text,
-                    reply_to_message_id=reply_to
-                )
-            elif reply_message.document:
-                await self.bot.send_document(
-                    user_id,
-                    document=reply_message.document.file_id,
-                    caption=caption_text,
-                    reply_to_message_id=reply_to
-                )
-            elif reply_message.text:
-                await self.bot.send_message(
-                    user_id,
-                    text=caption_text,
-                    reply_to_message_id=reply_to
-                )
-            else:
-                await self.bot.send_message(
-                    user_id,
-                    text=caption_text
-                )
-            
-            # Удаляем фидбек из БД
-            await FeedbackRepository.delete(session, feedback_id)
-            await session.commit()
-            
-            return True
-            
-        except Exception as e:
-            # Если не получилось с reply - пробуем без него
-            logger.warning(f"Failed to send reply with reply_to: {e}")
-            
+        # Резолвим вызов отправки один раз; попытки отличаются только
+        # наличием reply_to_message_id - без дублирования веток
+        media_type, media_file_id = _detect_media(reply_message)
+
+        if media_type in _CAPTIONABLE:
+            method, _ = _MEDIA_SENDERS[media_type]
+            send_call = getattr(self.bot, method)
+            send_args = (user_id, media_file_id)
+            send_kwargs = {'caption': caption_text}
+        else:
+            send_call = self.bot.send_message
+            send_args = (user_id,)
+            send_kwargs = {'text': caption_text}
+
+        # Сначала пытаемся с reply (если есть на что отвечать),
+        # при ошибке - повторяем без него
+        attempts = [{}]
+        if media_type in _CAPTIONABLE or reply_message.text:
+            attempts.insert(
+                0, {'reply_to_message_id': feedback.user_message_id}
+            )
+
+        for i, extra in enumerate(attempts):
             try:
-                if reply_message.photo:
-                    await self.bot.send_photo(
-                        user_id,
-                        photo=reply_message.photo[-1].file_id,
-                        caption=caption_text
-                    )
-                elif reply_message.text:
-                    await self.bot.send_message(user_id, text=caption_text)
-                
-                await FeedbackRepository.delete(session, feedback_id)
-                await session.commit()
-                return True
-                
-            except Exception as e2:
-                logger.error(f"Failed to send reply completely: {e2}")
+                await send_call(*send_args, **send_kwargs, **extra)
+                break
+            except Exception as e:
+                if i < len(attempts) - 1:
+                    logger.warning(f"Failed to send reply with reply_to: {e}")
+                    continue
+
+                logger.error(f"Failed to send reply completely: {e}")
                 # Всё равно удаляем фидбек
                 await FeedbackRepository.delete(session, feedback_id)
                 await session.commit()
+                _page_cache.clear()
                 return False
+
+        # Удаляем фидбек в фоне - админу не нужно ждать bookkeeping,
+        # чтобы увидеть подтверждение отправки
+        asyncio.create_task(self._finalize_delete(feedback_id))
+
+        return True
+
+    async def _finalize_delete(self, feedback_id: int):
+        """Удалить отвеченный фидбек в короткой фоновой сессии"""
+        from database.session import db_session
+
+        try:
+            async with db_session.async_session_maker() as session:
+                await FeedbackRepository.delete(session, feedback_id)
+                await session.commit()
+            _page_cache.clear()
+        except Exception as e:
+            logger.error(f"Failed to delete feedback {feedback_id}: {e}")
@@ -2,13 +2,18 @@
 Сервис для очистки inline-клавиатур (reply_markup) по TTL
 """
 import asyncio
-from typing import Optional
+import time
+from typing import Dict, Optional, Tuple
 
 from aiogram import Bot
 from loguru import logger
 
 from bot.utils.message_queue import MessageQueue, MessagePriority
 
+# Не больше 30 вызовов edit_message_reply_markup за проход -
+# глобальный лимит Telegram ~30 запросов/сек
+_FLUSH_CHUNK = 30
+
 
 class KeyboardCleanupService:
     """Планирует удаление inline-клавиатуры у сообщений через заданный TTL"""
@@ -22,6 +27,29 @@ class KeyboardCleanupService:
         self.bot = bot
         self.message_queue = message_queue
         self.default_ttl_seconds = max(0, int(default_ttl_seconds))
+        # Отложенные очистки: {(chat_id, message_id): monotonic-дедлайн}.
+        # Dict дедуплицирует повторные schedule_clear по одному сообщению,
+        # а один фоновый consumer заменяет task-на-каждый-вызов
+        self._pending: Dict[Tuple[int, int], float] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_task = None
+
+    async def start(self):
+        """Запустить фоновую задачу сброса отложенных очисток"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+            logger.info("Keyboard cleanup service started")
+
+    async def stop(self):
+        """Остановить фоновую задачу"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+            logger.info("Keyboard cleanup service stopped")
 
     async def schedule_clear(
         self,
@@ -43,17 +71,52 @@ class KeyboardCleanupService:
             await self._clear_keyboard(chat_id, message_id)
             return
 
-        asyncio.create_task(self._delayed_clear(delay, chat_id, message_id))
+        self._pending[(chat_id, message_id)] = time.monotonic() + delay
+        # Будим consumer - новый дедлайн может быть раньше текущего сна
+        self._wakeup.set()
 
-    async def _delayed_clear(self, delay: int, chat_id: int, message_id: int):
-        try:
-            await asyncio.sleep(delay)
-            await self._clear_keyboard(chat_id, message_id)
-        except asyncio.CancelledError:
-            # Задача отменена — ничего не делаем
-            pass
-        except Exception as e:
-            logger.debug(f"KeyboardCleanupService delayed clear error: {e}")
+    async def _flush_loop(self):
+        """Единственный consumer: спит до ближайшего дедлайна и сбрасывает
+        все созревшие очистки пачками"""
+        while True:
+            try:
+                if not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                now = time.monotonic()
+                earliest = min(self._pending.values())
+                if earliest > now:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), timeout=earliest - now
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                due = [
+                    key for key, deadline in self._pending.items()
+                    if deadline <= now
+                ]
+                for key in due:
+                    self._pending.pop(key, None)
+
+                for i in range(0, len(due), _FLUSH_CHUNK):
+                    chunk = due[i:i + _FLUSH_CHUNK]
+                    await asyncio.gather(*(
+                        self._clear_keyboard(chat_id, message_id)
+                        for chat_id, message_id in chunk
+                    ))
+                    if i + _FLUSH_CHUNK < len(due):
+                        await asyncio.sleep(1.05)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.debug(f"KeyboardCleanupService flush error: {e}")
 
     async def _clear_keyboard(self, chat_id: int, message_id: int):
         """Очистить клавиатуру, игнорируя ошибки (сообщение могло быть удалено/изменено)."""
@@ -68,5 +131,3 @@ class KeyboardCleanupService:
         except Exception as e:
             # Ошибки тут не критичны
             logger.debug(f"KeyboardCleanupService clear failed for {chat_id}:{message_id} — {e}")
-
-
@@ -2,17 +2,62 @@
 HTTP сервер для экспорта метрик Prometheus
 """
 import asyncio
+import os
+import time
 from aiohttp import web
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, CollectorRegistry, REGISTRY
 from loguru import logger
 
 
+def _build_registry():
+    """
+    Выбрать реестр метрик
+
+    Если задан PROMETHEUS_MULTIPROC_DIR (несколько воркеров), метрики
+    агрегируются по всем процессам через MultiProcessCollector - иначе
+    каждый воркер публиковал бы собственные несогласованные значения.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+_registry = _build_registry()
+
+# Сериализация всего реестра - CPU-bound; при нескольких Prometheus'ах
+# (федерация) текст кэшируется на секунду и отдается всем scrape'ам
+_PAYLOAD_TTL = 1.0
+_payload_cache = (0.0, b'')
+
+# Размер чанка при стриминге ответа
+_CHUNK_SIZE = 8192
+
+
 async def metrics_handler(request):
     """Handler для /metrics endpoint"""
-    metrics = generate_latest()
-    # Разделяем content_type и charset, так как aiohttp не позволяет передавать charset в content_type
-    content_type = CONTENT_TYPE_LATEST.split(';')[0]
-    return web.Response(body=metrics, content_type=content_type, charset='utf-8')
+    global _payload_cache
+    now = time.monotonic()
+    cached_at, payload = _payload_cache
+    if not payload or now - cached_at > _PAYLOAD_TTL:
+        payload = generate_latest(_registry)
+        _payload_cache = (now, payload)
+
+    # StreamResponse пишет кэшированный текст чанками прямо в сокет,
+    # без второй полной копии тела внутри web.Response
+    response = web.StreamResponse(
+        headers={'Content-Type': CONTENT_TYPE_LATEST}
+    )
+    # Текстовый формат Prometheus сжимается ~10x
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.enable_compression()
+    await response.prepare(request)
+    for i in range(0, len(payload), _CHUNK_SIZE):
+        await response.write(payload[i:i + _CHUNK_SIZE])
+    await response.write_eof()
+    return response
 
 
 async def health_handler(request):
@@ -10,10 +10,35 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from loguru import logger
 
+from sqlalchemy import bindparam, delete, select
+
+from database.models import AlertedLesson, BlockedUser
 from database.repository import UserRepository, ChatRepository
 from bot.services.schedule import schedule_service
 from bot.utils.message_queue import MessageQueue, MessagePriority
 
+# Statement'ы собираются один раз на импорт - cutoff подставляется через
+# bindparam, так что компиляция стабильно попадает в кэш SQLAlchemy.
+# synchronize_session=False: bulk delete не трогает identity map -
+# в сессиях cleanup-джобов загруженных объектов этих таблиц нет
+_CLEANUP_ALERTED_STMT = delete(AlertedLesson).execution_options(
+    synchronize_session=False
+)
+# Удаление порциями: короткие транзакции не держат блокировки и не
+# морят пул на большой таблице. Индекс idx_blocked_at по blocked_at
+# уже есть в схеме - подзапрос идет index-range сканом
+_CLEANUP_BLOCKED_CHUNK = 1000
+_CLEANUP_BLOCKED_STMT = delete(BlockedUser).where(
+    BlockedUser.userid.in_(
+        select(BlockedUser.userid)
+        .where(BlockedUser.blocked_at < bindparam('cutoff'))
+        .limit(_CLEANUP_BLOCKED_CHUNK)
+    )
+).execution_options(synchronize_session=False)
+
+# Размер пачки рассылки под глобальный лимит Telegram 30 msg/s
+_BATCH_SIZE = 30
+
 
 class NotificationService:
     """Сервис для отправки уведомлений"""
@@ -23,6 +48,9 @@ class NotificationService:
         self.message_queue = message_queue
         self.schedule_service = schedule_service
         self.scheduler = AsyncIOScheduler()
+        # Глобальный лимит Telegram ~30 сообщений/сек на бота - общий
+        # семафор для всех путей отправки уведомлений
+        self._send_semaphore = asyncio.Semaphore(_BATCH_SIZE)
     
     def start(self):
         """Запустить планировщик уведомлений"""
@@ -60,63 +88,95 @@ class NotificationService:
         from database.session import db_session
         
         now = datetime.now()
-        current_time = now.strftime("%H:%M")
+        # f-string вместо strftime - без таблиц форматирования C-локали
+        current_time = f"{now.hour:02d}:{now.minute:02d}"
         
+        # Фаза 1: короткая сессия только на выборку получателей и
+        # построение текстов - соединение не виснет на время рассылки
+        recipients = []
+        responses = {}
+
         async for session in db_session.get_session():
             try:
                 # Получаем пользователей с уведомлениями на это время
                 users = await UserRepository.get_all_with_notifications(
-                    session, 
+                    session,
                     current_time
                 )
-                
-                for user in users:
-                    await self._send_daily_schedule(session, user.userid, user.group)
-                
+
                 # Получаем чаты с уведомлениями
                 chats = await ChatRepository.get_all_with_notifications(
                     session,
                     current_time
                 )
-                
-                for chat in chats:
-                    await self._send_daily_schedule(session, chat.chatid, chat.group)
-                
-                await session.commit()
-                
+
+                recipients = (
+                    [(user.userid, user.group) for user in users]
+                    + [(chat.chatid, chat.group) for chat in chats]
+                )
+
+                # Многие получатели в одной группе - строим ответ один раз
+                # на группу за тик вместо N+1 вызовов get_day_response
+                for group in {group for _, group in recipients}:
+                    responses[group] = await self.schedule_service.get_day_response(
+                        session, group, now
+                    )
+
             except Exception as e:
                 logger.error(f"Error in send_daily_notifications: {e}")
                 await session.rollback()
+                return
+
+        # Фаза 2: рассылка уже без сессии - enqueue и паузы между пачками
+        # больше не держат DB-соединение занятым
+
+        # Сводим рассылку к одному сообщению на чат: получатель,
+        # попавший в выборку несколько раз (и как пользователь,
+        # и как групповой чат), получает один склеенный текст -
+        # это бережет лимит 20 msg/min на группу
+        payload_by_chat = {}
+        for chat_id, group in recipients:
+            text = responses[group]
+            existing = payload_by_chat.get(chat_id)
+            if existing is None:
+                payload_by_chat[chat_id] = text
+            elif text not in existing:
+                payload_by_chat[chat_id] = f"{existing}\n\n{text}"
+
+        targets = list(payload_by_chat.items())
+
+        # Рассылаем пачками по 30 получателей с паузой ~1с между
+        # пачками - вместо последовательного await на каждого
+        for i in range(0, len(targets), _BATCH_SIZE):
+            chunk = targets[i:i + _BATCH_SIZE]
+            await asyncio.gather(*(
+                self._send_daily_schedule(chat_id, text)
+                for chat_id, text in chunk
+            ))
+            if i + _BATCH_SIZE < len(targets):
+                await asyncio.sleep(1.05)
     
     async def _send_daily_schedule(
         self,
-        session: AsyncSession,
         chat_id: int,
-        group: str
+        response: str
     ):
         """
         Отправить расписание на день
-        
+
         Args:
-            session: Сессия БД
             chat_id: ID чата
-            group: Номер группы
+            response: Готовый текст расписания для группы получателя
         """
         try:
-            today = datetime.now()
-            response = await self.schedule_service.get_day_response(
-                session,
-                group,
-                today
-            )
-            
             # Добавляем в очередь с обычным приоритетом
-            await self.message_queue.enqueue(
-                self.bot.send_message,
-                chat_id,
-                response,
-                priority=MessagePriority.NORMAL
-            )
+            async with self._send_semaphore:
+                await self.message_queue.enqueue(
+                    self.bot.send_message,
+                    chat_id,
+                    response,
+                    priority=MessagePriority.NORMAL
+                )
             
         except Exception as e:
             logger.error(f"Error sending daily schedule to {chat_id}: {e}")
@@ -140,68 +200,69 @@ class NotificationService:
             lesson_info: Информация о паре
         """
         try:
-            # Парсим время
+            # Парсим время; datetime.now() берем один раз на вызов
+            now = datetime.now()
             hour, minute = map(int, lesson_time.split(':'))
-            lesson_datetime = datetime.now().replace(
+            lesson_datetime = now.replace(
                 hour=hour,
                 minute=minute,
                 second=0,
                 microsecond=0
             )
-            
+
             # Время уведомления - за 5 минут
             notification_time = lesson_datetime - timedelta(minutes=5)
-            
+
             # Если время еще не прошло
-            if notification_time > datetime.now():
-                delay = (notification_time - datetime.now()).total_seconds()
-                
-                # Планируем асинхронно
-                asyncio.create_task(
-                    self._send_delayed_notification(
-                        delay,
+            if notification_time > now:
+                # Одноразовый job в общем планировщике вместо голого
+                # create_task: не теряется при рестарте процесса до срока,
+                # виден в интроспекции, а replace_existing дедуплицирует
+                # повторные напоминания об одной и той же паре
+                self.scheduler.add_job(
+                    self._send_delayed_notification,
+                    'date',
+                    run_date=notification_time,
+                    args=[
                         chat_id,
                         f"🔔 Напоминание!\n\n{lesson_info}\n\n⏰ Начало через 5 минут!"
-                    )
+                    ],
+                    id=f"lesson:{chat_id}:{lesson_time}",
+                    replace_existing=True
                 )
         except Exception as e:
             logger.error(f"Error scheduling online lesson notification: {e}")
-    
+
     async def _send_delayed_notification(
         self,
-        delay: float,
         chat_id: int,
         text: str
     ):
         """
-        Отправить уведомление с задержкой
-        
+        Отправить отложенное уведомление (вызывается планировщиком)
+
         Args:
-            delay: Задержка в секундах
             chat_id: ID чата
             text: Текст сообщения
         """
-        await asyncio.sleep(delay)
-        
-        await self.message_queue.enqueue(
-            self.bot.send_message,
-            chat_id,
-            text,
-            priority=MessagePriority.HIGH
-        )
+        async with self._send_semaphore:
+            await self.message_queue.enqueue(
+                self.bot.send_message,
+                chat_id,
+                text,
+                priority=MessagePriority.HIGH
+            )
     
     async def cleanup_daily(self):
         """Ежедневная очистка"""
         from database.session import db_session
-        from database.models import AlertedLesson
-        from sqlalchemy import delete
-        
+
         logger.info("Running daily cleanup...")
-        
+
         async for session in db_session.get_session():
             try:
                 # Очищаем таблицу alerted_lessons
-                await session.execute(delete(AlertedLesson))
+                await session.execute(_CLEANUP_ALERTED_STMT)
                 await session.commit()
                 
                 # Очищаем кэш расписания
@@ -216,20 +277,22 @@ class NotificationService:
     async def cleanup_blocked_users(self):
         """Очистка старых заблокированных пользователей"""
         from database.session import db_session
-        from database.models import BlockedUser
-        from sqlalchemy import delete
-        
+
         logger.info("Cleaning up old blocked users...")
-        
+
         async for session in db_session.get_session():
             try:
-                # Удаляем пользователей, заблокировавших бота более 7 дней назад
+                # Удаляем пользователей, заблокировавших бота более 7 дней
+                # назад - порциями, коммит после каждой
                 cutoff_date = datetime.now() - timedelta(days=7)
-                
-                await session.execute(
-                    delete(BlockedUser).where(BlockedUser.blocked_at < cutoff_date)
-                )
-                await session.commit()
+
+                while True:
+                    result = await session.execute(
+                        _CLEANUP_BLOCKED_STMT, {'cutoff': cutoff_date}
+                    )
+                    await session.commit()
+                    if result.rowcount < _CLEANUP_BLOCKED_CHUNK:
+                        break
                 
                 logger.info("Blocked users cleanup completed")
                 
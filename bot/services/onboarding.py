@@ -1,6 +1,7 @@
 """
 Онбординг нового пользователя: роль → группа → подгруппа → уведомления → подсказки
 """
+import asyncio
 from typing import Optional, List
 from aiogram import Bot
 from aiogram.types import Message, CallbackQuery
@@ -16,12 +17,66 @@ from bot.utils import (
     build_skip_keyboard,
     extract_group_from_text,
     validate_time_format,
-    escape_markdown_v2,
 )
 from database.repository import UserRepository
 from bot.services.schedule import schedule_service
 
 
+# Онбординг - многошаговый сценарий: состояние живет сутки,
+# а не дефолтные 60 секунд интерактивных команд
+_ONBOARDING_STATE_TTL = 86400
+
+# Клавиатуры и экранированные тексты шагов неизменны -
+# собираются один раз на импорт, а не на каждый вызов
+_ROLE_KB = build_role_selection_keyboard()
+_SKIP_KB = build_skip_keyboard("onb:skip")
+_SUBGROUP_KB = build_subgroup_keyboard(prefix="subg_onb")
+_DAILY_KB = build_yes_no_keyboard(
+    yes_callback="onb:daily:yes",
+    no_callback="onb:daily:no"
+)
+_TIME_KB = build_time_selection_keyboard(
+    ["08:00", "20:00"], callback_prefix="onb:time"
+)
+_ONLINE_KB = build_yes_no_keyboard(
+    yes_callback="onb:online:yes",
+    no_callback="onb:online:no"
+)
+
+# Приветствие без разметки - парсинг на стороне Telegram не нужен;
+# подсказка по группе использует HTML с единственным <code> вместо
+# MarkdownV2 с экранированием всего текста
+_WELCOME_TEXT = "👋 Привет! Помогу быстро настроить расписание. Давай начнём с роли:"
+_GROUP_PROMPT = (
+    "Укажи свою группу в формате 241-362.\n"
+    "Можно просто написать номер группы или команду <code>/add 241-362</code>"
+)
+
+# Ключи (chat_id, user_id) с активным онбордингом: O(1)-проверка
+# принадлежности в process_message вместо обращения к менеджеру
+# состояний на каждое сообщение (подавляющее большинство трафика -
+# пользователи вне онбординга)
+_active_onboarding: set = set()
+
+
+async def _safe_answer(callback: CallbackQuery):
+    try:
+        await callback.answer()
+    except Exception:
+        pass
+
+
+def _ack(callback: CallbackQuery):
+    """
+    Подтвердить callback в фоне, не дожидаясь ответа Telegram.
+
+    Результат answerCallbackQuery нигде не используется, а лимит
+    в 15 секунд фоновая задача выдерживает с запасом - экономим
+    один последовательный RTT на каждое нажатие кнопки
+    """
+    asyncio.create_task(_safe_answer(callback))
+
+
 class OnboardingFlow:
     """Пошаговый онбординг пользователя"""
 
@@ -29,16 +84,45 @@ class OnboardingFlow:
         self.bot = bot
         self.chat_id = chat_id
         self.user_id = user_id
+        # Таблица диспетчеризации callback-ов вместо цепочки if/elif;
+        # 'time' обрабатывается отдельно из-за другой сигнатуры
+        self._dispatch = {
+            'daily': self.handle_daily_choice,
+            'online': self.handle_online_choice,
+        }
 
     def _set_step(self, step: str, extra: Optional[dict] = None):
         data = {'action': 'onboarding', 'step': step}
+        # Накопленные поля профиля переносим между шагами
+        prev = self._get_state()
+        if prev and 'fields' in prev:
+            data['fields'] = prev['fields']
         if extra:
             data.update(extra)
-        state_manager.set_state(self.chat_id, self.user_id, data)
+        state_manager.set_state(
+            self.chat_id, self.user_id, data,
+            ttl_seconds=_ONBOARDING_STATE_TTL
+        )
+        _active_onboarding.add((self.chat_id, self.user_id))
 
     def _update(self, data: dict):
         state_manager.update_state(self.chat_id, self.user_id, data)
 
+    def _stash(self, **fields):
+        """
+        Накопить поля профиля в состоянии онбординга.
+
+        Сессия живет в пределах одного апдейта, поэтому вместо
+        UPSERT + commit на каждое нажатие кнопки поля копятся здесь
+        и уходят в БД одним UPSERT в finish()/skip()
+        """
+        state = self._get_state()
+        if state is None:
+            return
+        pending = state.get('fields', {})
+        pending.update(fields)
+        self._update({'fields': pending})
+
     def _get_state(self) -> Optional[dict]:
         return state_manager.get_state(self.chat_id, self.user_id)
 
@@ -48,42 +132,30 @@ class OnboardingFlow:
         try:
             await self.bot.send_message(
                 self.chat_id,
-                escape_markdown_v2(
-                    "👋 Привет! Помогу быстро настроить расписание. Давай начнём с роли:"
-                ),
-                parse_mode="MarkdownV2",
-                reply_markup=build_role_selection_keyboard()
+                _WELCOME_TEXT,
+                reply_markup=_ROLE_KB
             )
         except Exception as e:
             logger.error(f"Failed to send onboarding welcome: {e}")
 
     async def handle_role_selected(self, session: AsyncSession, role: str, callback: Optional[CallbackQuery] = None):
         """Обработка выбора роли и переход к группе"""
-        user = await UserRepository.get_by_id(session, self.user_id)
-        if user:
-            await UserRepository.update(session, self.user_id, role=role)
-        else:
-            await UserRepository.create(
-                session,
-                user_id=self.user_id,
-                role=role
-            )
-        await session.commit()
+        self._stash(role=role)
 
         if callback:
-            try:
-                await callback.answer()
-            except Exception:
-                pass
-            try:
-                await callback.message.edit_text(
+            _ack(callback)
+            # Редактирование подтверждения и следующий вопрос независимы -
+            # шлем оба вызова Bot API параллельно; ошибки edit_text
+            # (например, старое сообщение) игнорируются как и раньше
+            await asyncio.gather(
+                callback.message.edit_text(
                     f"✅ Роль выбрана: {'👨‍🎓 Студент' if role == 'student' else '👨‍🏫 Преподаватель'}"
-                )
-            except Exception:
-                # Если не удалось отредактировать (например, старое сообщение) — игнорируем
-                pass
-
-        await self._ask_group()
+                ),
+                self._ask_group(),
+                return_exceptions=True
+            )
+        else:
+            await self._ask_group()
 
     async def _ask_group(self):
         """Попросить пользователя указать группу"""
@@ -91,12 +163,9 @@ class OnboardingFlow:
         try:
             await self.bot.send_message(
                 self.chat_id,
-                escape_markdown_v2(
-                    "Укажи свою группу в формате 241\-362.\n"
-                    "Можно просто написать номер группы или команду `/add 241-362`"
-                ),
-                parse_mode="MarkdownV2",
-                reply_markup=build_skip_keyboard("onb:skip")
+                _GROUP_PROMPT,
+                parse_mode="HTML",
+                reply_markup=_SKIP_KB
             )
         except Exception as e:
             logger.error(f"Failed to send group prompt: {e}")
@@ -108,19 +177,18 @@ class OnboardingFlow:
             await message.answer("❌ Не удалось распознать группу. Пример: 241-362")
             return
 
-        # Валидация группы по наличию расписания
-        schedule = await schedule_service.fetch_schedule(group)
-        if not schedule:
+        # Валидация группы по наличию расписания (с кэшем, включая
+        # отрицательные ответы - повторные попытки не бьют по API).
+        # None означает, что API не ответил - это не "группы нет"
+        exists = await schedule_service.group_exists(group)
+        if exists is None:
+            await message.answer("⚠️ Не удалось проверить группу: сервис расписаний временно недоступен. Попробуй ещё раз чуть позже.")
+            return
+        if not exists:
             await message.answer("❌ Такой группы не найдено в расписании. Проверь формат и номер.")
             return
 
-        # Сохраняем группу
-        user = await UserRepository.get_by_id(session, self.user_id)
-        if user:
-            await UserRepository.update(session, self.user_id, group=group)
-        else:
-            await UserRepository.create(session, user_id=self.user_id, group=group)
-        await session.commit()
+        self._stash(group=group)
 
         await message.answer(f"✅ Группа {group} сохранена")
         await self._ask_subgroup()
@@ -131,16 +199,13 @@ class OnboardingFlow:
             await self.bot.send_message(
                 self.chat_id,
                 "Выбери подгруппу (если есть):",
-                reply_markup=build_subgroup_keyboard(prefix="subg_onb")
+                reply_markup=_SUBGROUP_KB
             )
         except Exception as e:
             logger.error(f"Failed to send subgroup prompt: {e}")
 
     async def handle_subgroup_callback(self, session: AsyncSession, callback: CallbackQuery, subgroup_raw: str):
-        try:
-            await callback.answer()
-        except Exception:
-            pass
+        _ack(callback)
 
         if subgroup_raw == 'back':
             await self._ask_group()
@@ -153,19 +218,18 @@ class OnboardingFlow:
 
         if subgroup is not None:
             if subgroup == 0:
-                await UserRepository.update(session, self.user_id, subgroup=None)
+                self._stash(subgroup=None)
             elif subgroup in (1, 2):
-                await UserRepository.update(session, self.user_id, subgroup=subgroup)
-            await session.commit()
+                self._stash(subgroup=subgroup)
 
-        try:
-            await callback.message.edit_text(
+        # Подтверждение и следующий вопрос - параллельно
+        await asyncio.gather(
+            callback.message.edit_text(
                 f"✅ Подгруппа: {'Все' if not subgroup or subgroup == 0 else subgroup}"
-            )
-        except Exception:
-            pass
-
-        await self._ask_daily_notifications()
+            ),
+            self._ask_daily_notifications(),
+            return_exceptions=True
+        )
 
     async def _ask_daily_notifications(self):
         self._set_step('daily')
@@ -173,23 +237,16 @@ class OnboardingFlow:
             await self.bot.send_message(
                 self.chat_id,
                 "Включить ежедневные уведомления с расписанием?",
-                reply_markup=build_yes_no_keyboard(
-                    yes_callback="onb:daily:yes",
-                    no_callback="onb:daily:no"
-                )
+                reply_markup=_DAILY_KB
             )
         except Exception as e:
             logger.error(f"Failed to send daily notify prompt: {e}")
 
     async def handle_daily_choice(self, session: AsyncSession, choice: str, callback: CallbackQuery):
-        try:
-            await callback.answer()
-        except Exception:
-            pass
+        _ack(callback)
 
         enabled = choice == 'yes'
-        await UserRepository.update(session, self.user_id, daily_notify_enabled=enabled)
-        await session.commit()
+        self._stash(daily_notify_enabled=enabled)
 
         if enabled:
             await self._ask_time()
@@ -202,16 +259,13 @@ class OnboardingFlow:
             await self.bot.send_message(
                 self.chat_id,
                 "Во сколько присылать расписание? Выбери время или укажи своё в формате HH:MM",
-                reply_markup=build_time_selection_keyboard(["08:00", "20:00"], callback_prefix="onb:time")
+                reply_markup=_TIME_KB
             )
         except Exception as e:
             logger.error(f"Failed to send time prompt: {e}")
 
     async def handle_time_callback(self, session: AsyncSession, callback: CallbackQuery, token: str):
-        try:
-            await callback.answer()
-        except Exception:
-            pass
+        _ack(callback)
 
         if token == 'custom':
             self._set_step('time_custom')
@@ -219,28 +273,27 @@ class OnboardingFlow:
                 await self.bot.send_message(
                     self.chat_id,
                     "Напиши время в формате HH:MM",
-                    reply_markup=build_skip_keyboard("onb:skip")
+                    reply_markup=_SKIP_KB
                 )
             except Exception:
                 pass
             return
 
         # Предустановленное время
-        await UserRepository.update(session, self.user_id, notification_time=token)
-        await session.commit()
-        try:
-            await callback.message.edit_text(f"✅ Время уведомлений: {token}")
-        except Exception:
-            pass
-        await self._ask_online_notifications()
+        self._stash(notification_time=token)
+        # Подтверждение и следующий вопрос - параллельно
+        await asyncio.gather(
+            callback.message.edit_text(f"✅ Время уведомлений: {token}"),
+            self._ask_online_notifications(),
+            return_exceptions=True
+        )
 
     async def handle_time_message(self, session: AsyncSession, message: Message):
         time_str = (message.text or '').strip()
         if not validate_time_format(time_str):
             await message.answer("❌ Некорректное время. Пример: 08:00")
             return
-        await UserRepository.update(session, self.user_id, notification_time=time_str)
-        await session.commit()
+        self._stash(notification_time=time_str)
         await message.answer(f"✅ Время уведомлений: {time_str}")
         await self._ask_online_notifications()
 
@@ -250,35 +303,39 @@ class OnboardingFlow:
             await self.bot.send_message(
                 self.chat_id,
                 "Сообщать отдельно об онлайн-парах?",
-                reply_markup=build_yes_no_keyboard(
-                    yes_callback="onb:online:yes",
-                    no_callback="onb:online:no"
-                )
+                reply_markup=_ONLINE_KB
             )
         except Exception as e:
             logger.error(f"Failed to send online notify prompt: {e}")
 
     async def handle_online_choice(self, session: AsyncSession, choice: str, callback: CallbackQuery):
-        try:
-            await callback.answer()
-        except Exception:
-            pass
+        _ack(callback)
 
         enabled = choice == 'yes'
-        await UserRepository.update(session, self.user_id, notify_online=enabled)
-        await session.commit()
+        self._stash(notify_online=enabled)
         await self.finish(session)
 
-    async def skip(self):
+    async def skip(self, session: AsyncSession):
+        # Не теряем то, что пользователь успел указать до пропуска
+        state = self._get_state()
+        fields = state.get('fields') if state else None
+        if fields:
+            await UserRepository.upsert(session, self.user_id, **fields)
+            await session.commit()
         await self.bot.send_message(
             self.chat_id,
             "⏭ Онбординг пропущен. Настройки можно изменить в /settings"
         )
         state_manager.delete_state(self.chat_id, self.user_id)
+        _active_onboarding.discard((self.chat_id, self.user_id))
 
     async def finish(self, session: AsyncSession):
-        # Отмечаем завершение tutorial/онбординга
-        await UserRepository.update(session, self.user_id, tutorial_completed=True)
+        # Все накопленные шаги и отметка о завершении - один UPSERT
+        # и один commit вместо транзакции на каждое нажатие
+        state = self._get_state()
+        fields = dict(state.get('fields', {})) if state else {}
+        fields['tutorial_completed'] = True
+        await UserRepository.upsert(session, self.user_id, **fields)
         await session.commit()
 
         # Выводим подсказки
@@ -294,6 +351,7 @@ class OnboardingFlow:
         except Exception:
             pass
         state_manager.delete_state(self.chat_id, self.user_id)
+        _active_onboarding.discard((self.chat_id, self.user_id))
 
     async def process_callback(self, session: AsyncSession, callback: CallbackQuery) -> bool:
         """Общий обработчик callback-ов онбординга"""
@@ -301,31 +359,38 @@ class OnboardingFlow:
         if not data.startswith('onb:'):
             return False
 
-        parts = data.split(':')
         # onb:daily:yes|no; onb:time:08:00|custom; onb:online:yes|no; onb:skip
-        if len(parts) == 2 and parts[1] == 'skip':
-            await self.skip()
+        # partition вместо split+join: без промежуточного списка,
+        # значение с ':' внутри (время 08:00) остается целым
+        _, _, rest = data.partition(':')
+        if rest == 'skip':
+            await self.skip(session)
             return True
 
-        if len(parts) >= 3:
-            kind = parts[1]
-            value = ':'.join(parts[2:])
-            if kind == 'daily':
-                await self.handle_daily_choice(session, value, callback)
-                return True
-            if kind == 'time':
-                await self.handle_time_callback(session, callback, value)
-                return True
-            if kind == 'online':
-                await self.handle_online_choice(session, value, callback)
-                return True
+        kind, sep, value = rest.partition(':')
+        if not sep:
+            return False
+
+        if kind == 'time':
+            await self.handle_time_callback(session, callback, value)
+            return True
+        handler = self._dispatch.get(kind)
+        if handler is not None:
+            await handler(session, value, callback)
+            return True
 
         return False
 
     async def process_message(self, session: AsyncSession, message: Message) -> bool:
         """Обработка пользовательских сообщений на шагах онбординга"""
+        key = (self.chat_id, self.user_id)
+        if key not in _active_onboarding:
+            return False
+
         state = self._get_state()
         if not state or state.get('action') != 'onboarding':
+            # Состояние истекло - подчищаем быстрый индекс
+            _active_onboarding.discard(key)
             return False
 
         step = state.get('step')
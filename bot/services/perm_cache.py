@@ -0,0 +1,45 @@
+"""
+TTL-кэш прав администраторов
+"""
+import time
+from typing import Callable, Awaitable, Dict, List, Tuple
+
+
+class PermissionCache:
+    """In-process кэш прав администраторов с TTL.
+
+    Права меняются редко (минуты-часы), поэтому короткий TTL убирает
+    SELECT по правам с каждого события без риска устаревания.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache: Dict[int, Tuple[float, List[str]]] = {}
+
+    async def get_or_fetch(
+        self,
+        user_id: int,
+        fetch: Callable[[], Awaitable[List[str]]]
+    ) -> List[str]:
+        """Вернуть права из кэша или загрузить через fetch при промахе/истечении TTL"""
+        now = time.monotonic()
+        entry = self._cache.get(user_id)
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[1]
+
+        permissions = await fetch()
+
+        # Примитивная защита от неограниченного роста
+        if len(self._cache) >= self.maxsize:
+            self._cache.clear()
+        self._cache[user_id] = (now, permissions)
+        return permissions
+
+    def invalidate(self, user_id: int):
+        """Сбросить кэш прав пользователя (вызывать при изменении прав)"""
+        self._cache.pop(user_id, None)
+
+
+# Глобальный кэш прав администраторов
+perm_cache = PermissionCache()
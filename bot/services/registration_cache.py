@@ -0,0 +1,37 @@
+"""
+Кэш известных пользователей и чатов для ChatRegistrationMiddleware
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import User, Chat
+from loguru import logger
+
+
+class RegistrationCache:
+    """In-process кэш ID уже зарегистрированных пользователей и чатов.
+
+    Позволяет middleware проверять существование записи через membership-тест
+    по set вместо SELECT на каждое сообщение.
+    """
+
+    def __init__(self):
+        self.known_users: set[int] = set()
+        self.known_chats: set[int] = set()
+
+    async def warm(self, session: AsyncSession):
+        """Наполнить кэш ID из базы данных при старте бота"""
+        users_result = await session.execute(select(User.userid))
+        self.known_users = set(users_result.scalars().all())
+
+        chats_result = await session.execute(select(Chat.chatid))
+        self.known_chats = set(chats_result.scalars().all())
+
+        logger.info(
+            f"Registration cache warmed: {len(self.known_users)} users, "
+            f"{len(self.known_chats)} chats"
+        )
+
+
+# Глобальный кэш регистрации
+registration_cache = RegistrationCache()
@@ -1,10 +1,14 @@
 """
 Сервис для работы с расписанием
 """
+import asyncio
 import re
 import json
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional, Dict, List, Tuple, Any
-from datetime import datetime, timedelta
+from datetime import date as date_cls, datetime, timedelta
 from urllib.parse import quote
 from loguru import logger
 
@@ -13,30 +17,118 @@ from database.models import SemesterBoundary, Holiday
 from database.repository import GlobalGroupRepository
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from bot.services.api_client import api_client
+from bot.services.api_client import api_client, NOT_FOUND
+
+
+# Дни недели индексируются date.weekday() - кортежи на уровне модуля,
+# а не словарь/список на каждый вызов
+_WEEKDAY_KEYS = (
+    'monday', 'tuesday', 'wednesday', 'thursday',
+    'friday', 'saturday', 'sunday'
+)
+_WEEKDAY_NAMES_RU = (
+    "Понедельник", "Вторник", "Среда",
+    "Четверг", "Пятница", "Суббота", "Воскресенье"
+)
+
+# Границы рабочего дня в минутах от начала суток (9:00 - 21:00)
+_DAY_START_MIN = 9 * 60
+_DAY_END_MIN = 21 * 60
+
+# Сентинелы интернированных локаций в свертке свободных окон
+_LOC_UNKNOWN = 0   # пара без указания корпуса
+_LOC_TRAVEL = -1   # переезд между корпусами
+
+
+# Скомпилированные паттерны для распознавания онлайн-занятий:
+# одна альтернация вместо шести последовательных поисков подстрок
+_ONLINE_KW_RE = re.compile(r'online|вебинар|webinar|zoom|teams|meet', re.IGNORECASE)
+_URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+
+
+def _normalize_schedule(data: Any) -> Optional[Dict]:
+    """
+    Проверить структуру расписания один раз перед кэшированием.
+
+    Дни, не являющиеся словарями, и пары, не являющиеся списками,
+    выбрасываются здесь, чтобы рендер не гонял isinstance-проверки
+    на каждое сообщение
+    """
+    if not isinstance(data, dict):
+        return None
+    for day_key in _WEEKDAY_KEYS:
+        day_data = data.get(day_key)
+        if day_data is None:
+            continue
+        if not isinstance(day_data, dict):
+            data[day_key] = {}
+            continue
+        for pair_num in list(day_data):
+            if not isinstance(day_data[pair_num], list):
+                del day_data[pair_num]
+    return data
+
+
+def _unwrap_groups(data: Any) -> Optional[List[Dict]]:
+    """Достать список групп из ответа API"""
+    if isinstance(data, dict):
+        return data.get("groups")
+    return None
+
+
+def _unwrap_teachers(data: Any) -> Optional[List[Dict]]:
+    """Достать список преподавателей из ответа API"""
+    if isinstance(data, dict):
+        return data.get("teachers")
+    if isinstance(data, list):
+        return data
+    if data is not None:
+        logger.warning("Unexpected teachers response format: %s", type(data).__name__)
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _parse_iso(date_str: str) -> Optional[date_cls]:
+    """Распарсить дату ISO-формата с кэшем (fromisoformat - C-парсер)"""
+    try:
+        return date_cls.fromisoformat(date_str)
+    except ValueError:
+        return None
 
 
 class ScheduleCache:
-    """Кэш расписаний"""
-    
-    def __init__(self):
-        self.cache: Dict[str, Tuple[any, datetime]] = {}
-    
-    def get(self, key: str) -> Optional[any]:
+    """
+    Кэш расписаний: LRU с ограничением размера и TTL.
+
+    OrderedDict двигает ключ в конец при попадании, при переполнении
+    вытесняется самый давно не использованный. Срок хранится как
+    time.monotonic()-дедлайн - дешевле datetime.now() на каждый get
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.cache: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
         """Получить из кэша"""
-        if key in self.cache:
-            data, expires_at = self.cache[key]
-            if datetime.now() < expires_at:
-                return data
-            else:
-                del self.cache[key]
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if time.monotonic() < expires_at:
+            self.cache.move_to_end(key)
+            return data
+        del self.cache[key]
         return None
-    
-    def set(self, key: str, data: any, ttl_hours: int = 24):
+
+    def set(self, key: str, data: Any, ttl_hours: int = 24):
         """Сохранить в кэш"""
-        expires_at = datetime.now() + timedelta(hours=ttl_hours)
+        expires_at = time.monotonic() + ttl_hours * 3600
         self.cache[key] = (data, expires_at)
-    
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
     def clear(self):
         """Очистить кэш"""
         self.cache.clear()
@@ -44,79 +136,198 @@ class ScheduleCache:
 
 class ScheduleService:
     """Сервис для получения и обработки расписания"""
-    
+
+    # Праздники меняются редко - ответ (group, date) живет 10 минут
+    _HOLIDAY_CACHE_TTL = 600.0
+
     def __init__(self):
         self.cache = ScheduleCache()
         self.times = Constants.SCHEDULE_TIMES
         self.api = api_client
-    
+        # Разобранная таблица звонков: {тип: {пара: (start_min, end_min, слот)}}.
+        # split + перевод в минуты делаются один раз здесь, а не на
+        # каждую пару в горячих циклах
+        self._times_parsed: Dict[str, Dict[int, Tuple[int, int, str]]] = {}
+        for schedule_type, slots in self.times.items():
+            parsed = {}
+            for pair_num, time_slot in slots.items():
+                start_time, end_time = time_slot.split('-')
+                parsed[pair_num] = (
+                    self._time_to_minutes(start_time),
+                    self._time_to_minutes(end_time),
+                    time_slot
+                )
+            self._times_parsed[schedule_type] = parsed
+        # Кэш "группа существует": {группа: (bool, monotonic ts)}.
+        # В отличие от кэша расписаний помнит и отрицательные ответы -
+        # повторные опечатки при онбординге не ходят в API
+        self._group_exists_cache: Dict[str, Tuple[bool, float]] = {}
+        # Кэш проверок праздников: {(группа, дата): (monotonic дедлайн, ответ)}
+        self._holiday_cache: Dict[
+            Tuple[str, str], Tuple[float, Tuple[bool, Optional[str]]]
+        ] = {}
+        # Дедупликация конкурентных запросов: при N одновременных
+        # fetch_schedule одной группы в API идет только первый,
+        # остальные ждут его future
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def group_exists(self, group: str) -> Optional[bool]:
+        """
+        Проверить существование группы по наличию расписания
+
+        Args:
+            group: Номер группы
+
+        Returns:
+            True/False если API ответил, None если API недоступен
+            и проверить не удалось
+        """
+        cached = self._group_exists_cache.get(group)
+        if cached is not None and time.monotonic() - cached[1] < 3600:
+            return cached[0]
+
+        cache_key = f"schedule:{group}:False"
+        if self.cache.get(cache_key):
+            return True
+
+        # Запрашиваем API напрямую, а не через fetch_schedule: нужно
+        # отличить 404 (группы нет) от временного сбоя, который нельзя
+        # закэшировать на час как "группа не существует"
+        data = await self.api.get(f"/api/v1/schedules/group/number/{group}")
+        if data is NOT_FOUND:
+            exists = False
+        elif data is None:
+            return None
+        else:
+            normalized = _normalize_schedule(data)
+            if normalized:
+                # Расписание уже получено - кладем в кэш, чтобы первый
+                # показ после онбординга не ходил в API повторно
+                self.cache.set(cache_key, normalized)
+            exists = normalized is not None
+
+        self._group_exists_cache[group] = (exists, time.monotonic())
+        return exists
+
+    async def _cached_fetch(
+        self,
+        cache_key: str,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        ttl_hours: int = 24,
+        normalize=None
+    ) -> Optional[Any]:
+        """
+        Общий путь "кэш -> дедупликация -> API -> кэш" для всех fetch_*
+
+        Args:
+            cache_key: Ключ кэша
+            endpoint: Endpoint API
+            params: Параметры запроса
+            ttl_hours: Время жизни записи в кэше
+            normalize: Функция нормализации ответа перед кэшированием
+
+        Returns:
+            Данные из кэша или API, либо None
+        """
+        cached = self.cache.get(cache_key)
+        if cached:
+            return cached
+
+        # Такой же запрос уже в полете - ждем его результат
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            return await inflight
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+
+        try:
+            data = await self.api.get(endpoint, params=params)
+            # Для fetch_* маркер 404 эквивалентен отсутствию данных
+            if data is NOT_FOUND:
+                data = None
+            # Нормализация/проверка структуры делается один раз до
+            # кэширования - дальше потребители ей доверяют
+            if normalize is not None:
+                data = normalize(data)
+
+            if data:
+                self.cache.set(cache_key, data, ttl_hours=ttl_hours)
+
+            future.set_result(data)
+            return data
+        finally:
+            # При отмене/ошибке ожидающие получают None, а не зависают
+            if not future.done():
+                future.set_result(None)
+            self._inflight.pop(cache_key, None)
+
     async def fetch_schedule(self, group: str, is_session: bool = False) -> Optional[Dict]:
         """
         Получить расписание группы
-        
+
         Args:
             group: Номер группы
             is_session: Флаг сессии (экзамены)
-            
+
         Returns:
             Данные расписания или None
         """
-        # Проверяем кэш
-        cache_key = f"schedule:{group}:{is_session}"
-        cached = self.cache.get(cache_key)
-        if cached:
-            return cached
-        
         # Endpoint согласно спецификации: GET /api/v1/schedules/group/number/{number}
-        endpoint = f"/api/v1/schedules/group/number/{group}"
-        
-        # Добавляем параметр session если нужно
-        params = {}
-        if is_session:
-            params["session"] = 1
-        
-        # Выполняем запрос через API клиент
-        data = await self.api.get(endpoint, params=params)
-        
-        if data:
-            # Сохраняем в кэш
-            self.cache.set(cache_key, data)
-        else:
+        data = await self._cached_fetch(
+            f"schedule:{group}:{is_session}",
+            f"/api/v1/schedules/group/number/{group}",
+            params={"session": 1} if is_session else None,
+            normalize=_normalize_schedule
+        )
+        if not data:
             logger.warning(f"Failed to fetch schedule for group {group}")
-        
         return data
     
     async def is_holiday_or_vacation(
         self,
         session: AsyncSession,
         date: datetime,
-        group: str
+        group: str,
+        date_iso: Optional[str] = None
     ) -> Tuple[bool, Optional[str]]:
         """
         Проверить, является ли дата праздником или каникулами
-        
+
         Args:
             session: Сессия БД
             date: Дата для проверки
             group: Номер группы
-            
+            date_iso: Дата строкой YYYY-MM-DD, если уже посчитана
+
         Returns:
             (is_holiday, holiday_type)
         """
-        date_str = date.strftime("%d.%m.%Y")
-        
+        # ISO-строка сравнивается лексикографически - запрос идет по
+        # составному индексу idx_holidays_group_dates вместо скана таблицы
+        if date_iso is None:
+            date_iso = date.strftime("%Y-%m-%d")
+
+        cache_key = (group, date_iso)
+        cached = self._holiday_cache.get(cache_key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+
         result = await session.execute(
             select(Holiday).where(
                 ((Holiday.group == group) | (Holiday.group == "all")) &
-                (Holiday.start_date <= date_str) &
-                (Holiday.end_date >= date_str)
-            )
+                (Holiday.start_date <= date_iso) &
+                (Holiday.end_date >= date_iso)
+            ).limit(1)
         )
-        holiday = result.scalar_one_or_none()
-        
-        if holiday:
-            return True, holiday.type
-        return False, None
+        holiday = result.scalar()
+
+        answer = (True, holiday.type) if holiday else (False, None)
+        self._holiday_cache[cache_key] = (
+            time.monotonic() + self._HOLIDAY_CACHE_TTL, answer
+        )
+        return answer
     
     def get_schedule_for_date(
         self,
@@ -129,84 +340,83 @@ class ScheduleService:
         Args:
             schedule_data: Данные расписания (Week format)
             date: Дата
-            
+
         Returns:
-            Список занятий
+            Список кортежей (номер пары, занятие)
         """
         if not schedule_data:
             return []
         
-        # Маппинг дней недели на английские названия
-        weekday_names = {
-            0: 'monday',
-            1: 'tuesday', 
-            2: 'wednesday',
-            3: 'thursday',
-            4: 'friday',
-            5: 'saturday',
-            6: 'sunday'
-        }
-        
-        # Получаем название дня недели
-        weekday = date.weekday()  # 0 = понедельник
-        weekday_name = weekday_names.get(weekday, '')
-        
-        # Получаем данные для этого дня недели
-        day_data = schedule_data.get(weekday_name, {})
-        
-        if not day_data or not isinstance(day_data, dict):
+        # Получаем название дня недели (0 = понедельник)
+        weekday_name = _WEEKDAY_KEYS[date.weekday()]
+
+        # Получаем данные для этого дня недели (структура провалидирована
+        # при загрузке в _normalize_schedule)
+        day_data = schedule_data.get(weekday_name)
+
+        if not day_data:
             return []
-        
+
         lessons = []
-        
+
+        # ISO-строка даты считается один раз на вызов, а не на каждую
+        # пару; f-строка обходится без разбора формата в strftime
+        date_iso = f"{date.year}-{date.month:02d}-{date.day:02d}"
+
         # Получаем все пары на этот день
         for pair_num, pair_list in day_data.items():
-            if not isinstance(pair_list, list):
-                continue
-            
-            # Обрабатываем каждую пару
+            # Обрабатываем каждую пару: номер пары несем рядом
+            # кортежем, не копируя словарь занятия
             for pair in pair_list:
-                if self._is_lesson_on_date(pair, date):
-                    # Добавляем номер пары в данные
-                    pair_with_num = pair.copy()
-                    pair_with_num['pair_number'] = int(pair_num)
-                    lessons.append(pair_with_num)
-        
+                if self._is_lesson_on_date(pair, date, date_iso):
+                    lessons.append((int(pair_num), pair))
+
         # Сортируем по номеру пары
-        lessons.sort(key=lambda x: x.get('pair_number', 0))
-        
+        lessons.sort(key=lambda x: x[0])
+
         return lessons
     
-    def _is_lesson_on_date(self, lesson: Dict, date: datetime) -> bool:
+    def _is_lesson_on_date(
+        self,
+        lesson: Dict,
+        date: datetime,
+        date_iso: Optional[str] = None
+    ) -> bool:
         """
         Проверить, проводится ли занятие в указанную дату
-        
+
         Args:
             lesson: Данные занятия (Pair согласно API)
             date: Дата
-            
+            date_iso: Дата строкой YYYY-MM-DD (чтобы не форматировать на каждую пару)
+
         Returns:
             True если занятие проводится
         """
         # Проверяем поля start_date и end_date согласно спецификации API
         start_date_str = lesson.get('start_date')
         end_date_str = lesson.get('end_date')
-        
+
         # Если нет ограничений по дате - занятие проводится
         if not start_date_str or not end_date_str:
             return True
-        
-        try:
-            # Формат даты в API: "2025-02-01"
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
-            
-            # Проверяем попадает ли дата в диапазон
-            return start_date.date() <= date.date() <= end_date.date()
-            
-        except ValueError as e:
-            logger.warning(f"Invalid date format in lesson: {e}")
+
+        # Формат даты в API: "2025-02-01". ISO-даты сравниваются
+        # лексикографически - strptime на каждую пару не нужен
+        if len(start_date_str) == 10 and len(end_date_str) == 10:
+            if date_iso is None:
+                date_iso = date.strftime("%Y-%m-%d")
+            return start_date_str <= date_iso <= end_date_str
+
+        # Нестандартный формат - парсим (с кэшем) и сравниваем датами
+        start_date = _parse_iso(start_date_str)
+        end_date = _parse_iso(end_date_str)
+        if start_date is None or end_date is None:
+            logger.warning(
+                f"Invalid date format in lesson: {start_date_str} - {end_date_str}"
+            )
             return True
+        return start_date <= date.date() <= end_date
     
     def format_lesson(
         self,
@@ -227,7 +437,8 @@ class ScheduleService:
         Returns:
             Отформатированная строка
         """
-        # Получаем номер пары
+        # Получаем номер пары (занятия больше не копируются с
+        # подмешанным pair_number - номер передается явно)
         if lesson_number is None:
             lesson_number = lesson.get('pair_number', 1)
         
@@ -252,46 +463,46 @@ class ScheduleService:
         # Ссылка (согласно API)
         link = lesson.get('link', '')
         
-        # Формируем строку
-        result = f"🕐 {time_slot}\n"
-        result += f"📚 {subject}"
-        
+        # Формируем строку списком частей - один join вместо
+        # цепочки += с копированием строки на каждом шаге
+        parts = [f"🕐 {time_slot}\n", f"📚 {subject}"]
+
         # Добавляем тип занятия
         if lesson_type:
-            result += f" ({lesson_type})"
-        result += "\n"
-        
+            parts.append(f" ({lesson_type})")
+        parts.append("\n")
+
         # Преподаватели
         if teachers:
             if isinstance(teachers, list):
                 teachers_str = ", ".join(teachers)
             else:
                 teachers_str = str(teachers)
-            result += f"👨‍🏫 {teachers_str}\n"
-        
+            parts.append(f"👨‍🏫 {teachers_str}\n")
+
         # Аудитории и локация
         if rooms:
             if isinstance(rooms, list):
                 rooms_str = ", ".join(rooms)
             else:
                 rooms_str = str(rooms)
-            
+
             # Проверяем онлайн по ссылке или названию аудитории
             if link and ('http://' in link or 'https://' in link):
-                result += f"💻 Онлайн: {link}\n"
+                parts.append(f"💻 Онлайн: {link}\n")
             else:
-                result += f"🏛 {rooms_str}"
+                parts.append(f"🏛 {rooms_str}")
                 if location:
-                    result += f" ({location})"
-                result += "\n"
+                    parts.append(f" ({location})")
+                parts.append("\n")
         elif location:
-            result += f"🏛 {location}\n"
-        
+            parts.append(f"🏛 {location}\n")
+
         # Ссылка (если есть и не была использована выше)
         if link and not (rooms and ('http://' in link or 'https://' in link)):
-            result += f"🔗 {link}\n"
-        
-        return result
+            parts.append(f"🔗 {link}\n")
+
+        return "".join(parts)
     
     def _get_online_lesson_info(self, auditories: str) -> Optional[str]:
         """
@@ -305,21 +516,13 @@ class ScheduleService:
         """
         if not auditories:
             return None
-        
-        keywords = ['online', 'вебинар', 'webinar', 'zoom', 'teams', 'meet']
-        auditories_lower = auditories.lower()
-        
-        for keyword in keywords:
-            if keyword in auditories_lower:
-                # Пытаемся извлечь URL
-                url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-                urls = re.findall(url_pattern, auditories)
-                
-                if urls:
-                    return urls[0]
-                return "Да"
-        
-        return None
+
+        if not _ONLINE_KW_RE.search(auditories):
+            return None
+
+        # Пытаемся извлечь URL
+        match = _URL_RE.search(auditories)
+        return match.group(0) if match else "Да"
     
     async def get_day_response(
         self,
@@ -342,43 +545,53 @@ class ScheduleService:
         Returns:
             Текст сообщения
         """
+        # Дату форматируем один раз на запрос f-строками - без
+        # locale-машинерии strftime на каждое использование
+        date_display = f"{date.day:02d}.{date.month:02d}.{date.year}"
+        date_iso = f"{date.year}-{date.month:02d}-{date.day:02d}"
+        weekday_name = self._get_weekday_name(date.weekday())
+
         # Проверяем праздники
-        is_holiday, holiday_type = await self.is_holiday_or_vacation(session, date, group)
+        is_holiday, holiday_type = await self.is_holiday_or_vacation(
+            session, date, group, date_iso
+        )
         if is_holiday:
-            return f"🎉 {date.strftime('%d.%m.%Y')} - {holiday_type}!\nЗанятий нет."
-        
+            return f"🎉 {date_display} - {holiday_type}!\nЗанятий нет."
+
         # Получаем расписание
         schedule_data = await self.fetch_schedule(group, is_session)
         if not schedule_data:
             return f"❌ Не удалось получить расписание для группы {group}"
-        
+
         # Получаем занятия на дату
         lessons = self.get_schedule_for_date(schedule_data, date)
-        
+
         if not lessons:
-            return f"📅 {date.strftime('%d.%m.%Y')} ({self._get_weekday_name(date.weekday())})\n\nЗанятий нет 🎉"
-        
-        # Формируем ответ
-        response = f"📅 {date.strftime('%d.%m.%Y')} ({self._get_weekday_name(date.weekday())})\n"
-        response += f"Группа: {group}\n\n"
-        
+            return f"📅 {date_display} ({weekday_name})\n\nЗанятий нет 🎉"
+
+        # Формируем ответ одним join по списку кусков
+        chunks = [
+            f"📅 {date_display} ({weekday_name})\n",
+            f"Группа: {group}\n\n",
+        ]
+
         # Тип расписания (можно получить из данных или использовать по умолчанию)
         schedule_type = '0'  # По умолчанию используем стандартное расписание
-        
-        for lesson in lessons:
-            formatted = self.format_lesson(lesson, schedule_type=schedule_type, subgroup=subgroup)
+
+        for pair_number, lesson in lessons:
+            formatted = self.format_lesson(
+                lesson, lesson_number=pair_number,
+                schedule_type=schedule_type, subgroup=subgroup
+            )
             if formatted:
-                response += formatted + "\n"
-        
-        return response.strip()
+                chunks.append(formatted)
+                chunks.append("\n")
+
+        return "".join(chunks).strip()
     
     def _get_weekday_name(self, weekday: int) -> str:
         """Получить название дня недели"""
-        names = [
-            "Понедельник", "Вторник", "Среда", 
-            "Четверг", "Пятница", "Суббота", "Воскресенье"
-        ]
-        return names[weekday]
+        return _WEEKDAY_NAMES_RU[weekday]
     
     async def get_current_lesson(
         self,
@@ -398,8 +611,10 @@ class ScheduleService:
             Текст сообщения
         """
         now = datetime.now()
-        current_time = now.strftime("%H:%M")
-        
+        # Текущее время в минутах от начала дня - сравнение целыми
+        # числами вместо strftime и лексикографики по строкам
+        current_minutes = now.hour * 60 + now.minute
+
         # Получаем расписание
         schedule_data = await self.fetch_schedule(group, is_session)
         if not schedule_data:
@@ -413,21 +628,22 @@ class ScheduleService:
         
         # Тип расписания
         schedule_type = '0'
-        times = self.times.get(schedule_type, {})
-        
+        times_parsed = self._times_parsed.get(schedule_type, {})
+
         # Ищем текущее занятие
-        for lesson in lessons:
-            pair_number = lesson.get('pair_number', 0)
-            time_slot = times.get(pair_number, "")
-            if not time_slot:
+        for pair_number, lesson in lessons:
+            slot = times_parsed.get(pair_number)
+            if slot is None:
                 continue
-            
-            start_time, end_time = time_slot.split('-')
-            
+
+            start_minutes, end_minutes, time_slot = slot
+
             # Сравниваем время
-            if start_time <= current_time <= end_time:
+            if start_minutes <= current_minutes <= end_minutes:
                 response = f"⏰ Текущее занятие ({time_slot}):\n\n"
-                response += self.format_lesson(lesson, schedule_type=schedule_type)
+                response += self.format_lesson(
+                    lesson, lesson_number=pair_number, schedule_type=schedule_type
+                )
                 return response
         
         return "📚 Сейчас окно между парами"
@@ -439,27 +655,13 @@ class ScheduleService:
         Returns:
             Список групп или None
         """
-        # Проверяем кэш
-        cache_key = "groups:all"
-        cached = self.cache.get(cache_key)
-        if cached:
-            return cached
-        
-        # Endpoint: GET /api/v1/groups/
-        endpoint = "/api/v1/groups/"
-        
-        # Выполняем запрос через API клиент
-        data = await self.api.get(endpoint)
-        
-        if data and "groups" in data:
-            groups_data = data["groups"]
-            
-            # Сохраняем в кэш на 7 дней
-            self.cache.set(cache_key, groups_data, ttl_hours=168)
-            
-            return groups_data
-        
-        return None
+        # Endpoint: GET /api/v1/groups/; кэш на 7 дней
+        return await self._cached_fetch(
+            "groups:all",
+            "/api/v1/groups/",
+            ttl_hours=168,
+            normalize=_unwrap_groups
+        )
     
     async def fetch_teachers(self) -> Optional[List[Dict]]:
         """
@@ -468,32 +670,13 @@ class ScheduleService:
         Returns:
             Список преподавателей или None
         """
-        # Проверяем кэш
-        cache_key = "teachers:all"
-        cached = self.cache.get(cache_key)
-        if cached:
-            return cached
-        
-        # Endpoint: GET /api/v1/teachers/
-        endpoint = "/api/v1/teachers/"
-        
-        # Выполняем запрос через API клиент
-        data = await self.api.get(endpoint)
-        
-        if data:
-            teachers_data: Optional[List[Dict[str, Any]]] = None
-            if isinstance(data, dict):
-                teachers_data = data.get("teachers")
-            elif isinstance(data, list):
-                teachers_data = data
-            
-            if teachers_data:
-                self.cache.set(cache_key, teachers_data, ttl_hours=168)
-                return teachers_data
-            
-            logger.warning("Unexpected teachers response format: %s", type(data).__name__)
-        
-        return None
+        # Endpoint: GET /api/v1/teachers/; кэш на 7 дней
+        return await self._cached_fetch(
+            "teachers:all",
+            "/api/v1/teachers/",
+            ttl_hours=168,
+            normalize=_unwrap_teachers
+        )
     
     async def fetch_schedule_by_teacher(
         self, 
@@ -510,29 +693,15 @@ class ScheduleService:
         Returns:
             Данные расписания или None
         """
-        # Проверяем кэш
-        cache_key = f"schedule:teacher:{teacher_fullname}:{is_session}"
-        cached = self.cache.get(cache_key)
-        if cached:
-            return cached
-        
         # Endpoint: GET /api/v1/schedules/teacher/fn/{fn}
         encoded_name = quote(teacher_fullname)
-        endpoint = f"/api/v1/schedules/teacher/fn/{encoded_name}"
-        
-        params = {}
-        if is_session:
-            params["session"] = 1
-        
-        # Выполняем запрос через API клиент
-        data = await self.api.get(endpoint, params=params)
-        
-        if data:
-            # Сохраняем в кэш
-            self.cache.set(cache_key, data)
-        
-        return data
-    
+        return await self._cached_fetch(
+            f"schedule:teacher:{teacher_fullname}:{is_session}",
+            f"/api/v1/schedules/teacher/fn/{encoded_name}",
+            params={"session": 1} if is_session else None,
+            normalize=_normalize_schedule
+        )
+
     async def fetch_schedule_by_room(
         self, 
         room_number: str, 
@@ -548,32 +717,18 @@ class ScheduleService:
         Returns:
             Данные расписания или None
         """
-        # Проверяем кэш
-        cache_key = f"schedule:room:{room_number}:{is_session}"
-        cached = self.cache.get(cache_key)
-        if cached:
-            return cached
-        
         # Endpoint: GET /api/v1/schedules/room/number/{number}
-        endpoint = f"/api/v1/schedules/room/number/{room_number}"
-        
-        params = {}
-        if is_session:
-            params["session"] = 1
-        
-        # Выполняем запрос через API клиент
-        data = await self.api.get(endpoint, params=params)
-        
-        if data:
-            # Сохраняем в кэш
-            self.cache.set(cache_key, data)
-        
-        return data
-    
+        return await self._cached_fetch(
+            f"schedule:room:{room_number}:{is_session}",
+            f"/api/v1/schedules/room/number/{room_number}",
+            params={"session": 1} if is_session else None,
+            normalize=_normalize_schedule
+        )
+
     def _time_to_minutes(self, time_str: str) -> int:
         """Конвертировать время HH:MM в минуты от начала дня"""
-        hours, minutes = map(int, time_str.split(':'))
-        return hours * 60 + minutes
+        # Формат фиксированной ширины - срезы вместо split + map
+        return int(time_str[:2]) * 60 + int(time_str[3:5])
     
     def _minutes_to_time(self, minutes: int) -> str:
         """Конвертировать минуты от начала дня в HH:MM"""
@@ -590,31 +745,32 @@ class ScheduleService:
         location = (lesson.get('location') or '').strip().lower()
         return location == "webinar"
     
-    def _get_busy_intervals(self, lessons: List[Dict], schedule_type: str = '0') -> List[Tuple[int, int, Optional[str]]]:
+    def _get_busy_intervals(
+        self,
+        lessons: List[Tuple[int, Dict]],
+        schedule_type: str = '0'
+    ) -> List[Tuple[int, int, Optional[str]]]:
         """
         Получить занятые временные интервалы в минутах с локацией
         
         Args:
-            lessons: Список занятий
+            lessons: Список кортежей (номер пары, занятие)
             schedule_type: Тип расписания
             
         Returns:
             Список кортежей (start_minutes, end_minutes, location)
         """
-        times = self.times.get(schedule_type, {})
+        times_parsed = self._times_parsed.get(schedule_type, {})
         intervals = []
-        
-        for lesson in lessons:
+
+        for pair_num, lesson in lessons:
             if self._is_webinar_lesson(lesson):
                 continue
-            pair_num = lesson.get('pair_number', 0)
-            time_slot = times.get(pair_num, "")
-            if not time_slot:
+            slot = times_parsed.get(pair_num)
+            if slot is None:
                 continue
-            
-            start_time, end_time = time_slot.split('-')
-            start_minutes = self._time_to_minutes(start_time)
-            end_minutes = self._time_to_minutes(end_time)
+
+            start_minutes, end_minutes, _ = slot
             location = lesson.get('location', '')
             intervals.append((start_minutes, end_minutes, location))
         
@@ -636,51 +792,64 @@ class ScheduleService:
         return merged
     
     def _get_group_location_timeline(
-        self, 
-        busy_intervals: List[Tuple[int, int, str]],
+        self,
+        busy_intervals: List[Tuple[int, int, int]],
         day_start: int,
         day_end: int
-    ) -> List[Tuple[int, int, Optional[str]]]:
+    ) -> List[Tuple[int, int, Optional[int], bool]]:
         """
         Построить временную линию локаций группы на день
-        
+
         Args:
-            busy_intervals: Занятые интервалы с локациями
+            busy_intervals: Занятые интервалы с интернированными локациями
             day_start: Начало дня в минутах
             day_end: Конец дня в минутах
-            
+
         Returns:
-            Список (start, end, location) где location - где находится группа в это время
-            None означает что у группы нет пар в этот день вообще
+            Список (start, end, loc_id, is_busy), где loc_id -
+            интернированная локация группы в это время (None - пар в
+            этот день нет вообще, _LOC_UNKNOWN - без корпуса,
+            _LOC_TRAVEL - переезд), а is_busy - идет ли сейчас пара
         """
         if not busy_intervals:
             # У группы нет пар вообще - можно встретиться где угодно
-            return [(day_start, day_end, None)]
-        
-        # Собираем все уникальные локации за день
-        locations_in_day = set(loc for _, _, loc in busy_intervals if loc)
-        
-        # Если у группы все пары без указания локации
-        if not locations_in_day:
-            return [(day_start, day_end, "")]
-        
-        # Строим временную линию
+            return [(day_start, day_end, None, False)]
+
+        # Если у группы все пары без указания локации (any обрывается
+        # на первой заполненной - множество ради булевой проверки не строим)
+        if not any(loc_id != _LOC_UNKNOWN for _, _, loc_id in busy_intervals):
+            return [(day_start, day_end, _LOC_UNKNOWN, False)]
+
+        # Строим временную линию. Нулевые сегменты отбрасываются, а
+        # смежные куски с одинаковой локацией и доступностью сливаются -
+        # каждая лишняя граница множит итерации свертки свободных окон
         timeline = []
+
+        def append_segment(start, end, location, is_busy):
+            if end <= start:
+                return
+            if timeline:
+                last = timeline[-1]
+                if last[1] == start and last[2] == location and last[3] == is_busy:
+                    timeline[-1] = (last[0], end, location, is_busy)
+                    return
+            timeline.append((start, end, location, is_busy))
+
         current_time = day_start
-        
+
         # Сортируем интервалы по времени
         sorted_intervals = sorted(busy_intervals, key=lambda x: x[0])
-        
+
         for i, (start, end, location) in enumerate(sorted_intervals):
             # Период до пары - группа находится в локации этой пары
             # (они уже приехали или приедут к началу)
             if current_time < start:
-                timeline.append((current_time, start, location))
-            
+                append_segment(current_time, start, location, False)
+
             # Период самой пары
-            timeline.append((start, end, location))
+            append_segment(start, end, location, True)
             current_time = end
-            
+
             # После пары группа остается в этой локации до следующей пары
             # или до конца дня
             if i < len(sorted_intervals) - 1:
@@ -688,15 +857,14 @@ class ScheduleService:
                 if next_location != location:
                     # Следующая пара в другой локации - нужно время на переезд
                     # В промежутке группа недоступна для встреч
-                    timeline.append((end, next_start, f"переезд_{location}_to_{next_location}"))
+                    append_segment(end, next_start, _LOC_TRAVEL, False)
                 else:
                     # Следующая пара в той же локации
-                    timeline.append((end, next_start, location))
+                    append_segment(end, next_start, location, False)
             else:
                 # Последняя пара - группа остается в этой локации до конца дня
-                if current_time < day_end:
-                    timeline.append((current_time, day_end, location))
-        
+                append_segment(current_time, day_end, location, False)
+
         return timeline
     
     def _find_free_intervals_with_location(
@@ -715,27 +883,48 @@ class ScheduleService:
             Список свободных интервалов (start_minutes, end_minutes, location_info)
         """
         # Рабочий день: 9:00 - 21:00
-        day_start = self._time_to_minutes("09:00")
-        day_end = self._time_to_minutes("21:00")
-        
+        day_start = _DAY_START_MIN
+        day_end = _DAY_END_MIN
+
+        # Интернируем локации в маленькие int-ы: все сравнения внутри
+        # свертки становятся целочисленными, строки возвращаются только
+        # при выдаче результата
+        loc_to_id = {'': _LOC_UNKNOWN}
+        id_to_loc = ['']
+        interned_groups = []
+        for busy_intervals in all_busy_intervals:
+            interned = []
+            for start, end, loc in busy_intervals:
+                loc = loc or ''
+                loc_id = loc_to_id.get(loc)
+                if loc_id is None:
+                    loc_id = len(id_to_loc)
+                    loc_to_id[loc] = loc_id
+                    id_to_loc.append(loc)
+                interned.append((start, end, loc_id))
+            interned_groups.append(interned)
+
         # Строим временные линии для каждой группы
         timelines = []
-        for busy_intervals in all_busy_intervals:
+        for busy_intervals in interned_groups:
             timeline = self._get_group_location_timeline(busy_intervals, day_start, day_end)
             timelines.append(timeline)
         
-        # Создаем список всех временных точек
-        time_points = set([day_start, day_end])
-        for timeline in timelines:
-            for start, end, _ in timeline:
-                time_points.add(start)
-                time_points.add(end)
-        
-        time_points = sorted(time_points)
-        
+        # Все временные точки одним множеством - без диспетчеризации
+        # set.add на каждый кортеж
+        time_points = sorted({
+            day_start, day_end,
+            *(t for timeline in timelines for interval in timeline for t in interval[:2])
+        })
+
+        # Таймлайны отсортированы по построению - позицию каждой группы
+        # ищем указателем, который двигается только вперед по мере роста
+        # кандидатов, а не сканом таймлайна с нуля на каждый интервал
+        ptrs = [0] * len(timelines)
+
         # Анализируем каждый временной интервал
         free_intervals = []
-        
+
         for i in range(len(time_points) - 1):
             interval_start = time_points[i]
             interval_end = time_points[i + 1]
@@ -743,46 +932,46 @@ class ScheduleService:
             if interval_end - interval_start < min_duration:
                 continue
             
-            # Определяем где находится каждая группа в этот интервал
+            # Определяем где находится каждая группа в этот интервал;
+            # занятость берем из флага сегмента - отдельный проход по
+            # занятым интервалам не нужен
             groups_locations = {}
-            
+            is_any_busy = False
+
             for group_idx, timeline in enumerate(timelines):
-                for start, end, location in timeline:
-                    # Проверяем пересечение с текущим интервалом
-                    if start <= interval_start and end >= interval_end:
-                        groups_locations[group_idx] = location
-                        break
-            
+                ptr = ptrs[group_idx]
+                n = len(timeline)
+                # Сегменты, закончившиеся до конца кандидата, не покроют
+                # ни его, ни последующие интервалы
+                while ptr < n and timeline[ptr][1] < interval_end:
+                    ptr += 1
+                ptrs[group_idx] = ptr
+                if ptr < n and timeline[ptr][0] <= interval_start:
+                    groups_locations[group_idx] = timeline[ptr][2]
+                    if timeline[ptr][3]:
+                        is_any_busy = True
+
             # Проверяем условия для общего окна
-            if len(groups_locations) != len(timelines):
+            if is_any_busy or len(groups_locations) != len(timelines):
                 continue
-            
+
             locations = list(groups_locations.values())
-            
+
             # Фильтруем периоды переезда
-            if any(loc and loc.startswith("переезд_") for loc in locations):
-                continue
-            
-            # Проверяем, заняты ли группы
-            is_any_busy = False
-            for group_idx, busy_intervals in enumerate(all_busy_intervals):
-                for start, end, _ in busy_intervals:
-                    if start < interval_end and end > interval_start:
-                        is_any_busy = True
-                        break
-                if is_any_busy:
-                    break
-            
-            if is_any_busy:
+            if _LOC_TRAVEL in locations:
                 continue
-            
+
             # Если у всех нет привязки к корпусу — пропускаем (нельзя гарантировать встречу)
-            if all(not loc for loc in locations):
+            if all(loc is None or loc == _LOC_UNKNOWN for loc in locations):
                 continue
-            
-            # Если все локации одинаковые (и не None)
-            if len(set(locations)) == 1 and locations[0]:
-                free_intervals.append((interval_start, interval_end, {locations[0]: len(timelines)}))
+
+            # Если все локации одинаковые (и это конкретный корпус)
+            first = locations[0]
+            if (first is not None and first != _LOC_UNKNOWN
+                    and all(loc == first for loc in locations)):
+                free_intervals.append(
+                    (interval_start, interval_end, {id_to_loc[first]: len(timelines)})
+                )
         
         return free_intervals
     
@@ -802,8 +991,8 @@ class ScheduleService:
             Список свободных интервалов (start_minutes, end_minutes)
         """
         # Рабочий день: 9:00 - 21:00
-        day_start = self._time_to_minutes("09:00")
-        day_end = self._time_to_minutes("21:00")
+        day_start = _DAY_START_MIN
+        day_end = _DAY_END_MIN
         
         # Объединяем все занятые интервалы от всех групп (игнорируя локацию)
         all_busy = []
@@ -856,20 +1045,22 @@ class ScheduleService:
     
     def _format_lessons_overview(
         self,
-        lessons: List[Dict],
+        lessons: List[Tuple[int, Dict]],
         times: Dict[int, str]
     ) -> str:
         """
         Сформировать краткое описание списка занятий
         """
-        filtered = [lesson for lesson in lessons if not self._is_webinar_lesson(lesson)]
-        
+        filtered = [
+            (pair_num, lesson) for pair_num, lesson in lessons
+            if not self._is_webinar_lesson(lesson)
+        ]
+
         if not filtered:
             return "  Занятий нет\n"
-        
+
         lines = []
-        for lesson in filtered:
-            pair_num = lesson.get('pair_number', 0)
+        for pair_num, lesson in filtered:
             time_slot = times.get(pair_num, "??:??-??:??")
             subject = lesson.get('subject', 'Предмет не указан')
             location = lesson.get('location', '')
@@ -918,15 +1109,18 @@ class ScheduleService:
                 "❌ По воскресеньям пары не проводятся, сравнение не требуется."
             )
         
-        # Получаем расписания для всех групп
+        # Получаем расписания всех групп параллельно - сетевые запросы
+        # не ждут друг друга (дубликаты схлопывает in-flight map)
+        results = await asyncio.gather(
+            *(self.fetch_schedule(group, is_session) for group in groups)
+        )
+
         schedules = {}
-        for group in groups:
-            schedule_data = await self.fetch_schedule(group, is_session)
+        for group, schedule_data in zip(groups, results):
             if not schedule_data:
                 return f"❌ Не удалось получить расписание для группы {group}"
-            lessons = self.get_schedule_for_date(schedule_data, date)
-            schedules[group] = lessons
-        
+            schedules[group] = self.get_schedule_for_date(schedule_data, date)
+
         # Определяем занятые временные интервалы для каждой группы
         schedule_type = '0'
         times = self.times.get(schedule_type, {})
@@ -937,24 +1131,32 @@ class ScheduleService:
             busy_intervals = self._get_busy_intervals(lessons, schedule_type)
             all_busy_intervals.append(busy_intervals)
         
-        # Находим общие свободные окна с учетом локации
-        free_intervals_with_loc = self._find_free_intervals_with_location(all_busy_intervals, min_duration)
-        
-        # Формируем ответ
-        response = f"📊 Сравнение расписаний на {date.strftime('%d.%m.%Y')}\n"
-        response += f"Группы: {', '.join(groups)}\n"
+        # Если хоть у одной группы нет очных пар, ее локация на весь
+        # день неизвестна и совпадений по корпусу быть не может -
+        # свертка гарантированно вернет пусто, не гоняем ее
+        if all(all_busy_intervals):
+            free_intervals_with_loc = self._find_free_intervals_with_location(
+                all_busy_intervals, min_duration
+            )
+        else:
+            free_intervals_with_loc = []
+
+        # Формируем ответ списком кусков с одним join в конце
+        chunks = [
+            f"📊 Сравнение расписаний на {date.strftime('%d.%m.%Y')}\n",
+            f"Группы: {', '.join(groups)}\n",
+        ]
         if min_duration > 0:
-            response += f"Минимальная длительность окна: {min_duration} мин\n"
-        response += f"📍 Учитываются локации корпусов\n"
-        response += "\n"
-        
+            chunks.append(f"Минимальная длительность окна: {min_duration} мин\n")
+        chunks.append("📍 Учитываются локации корпусов\n\n")
+
         if free_intervals_with_loc:
-            response += "✅ Общие свободные окна:\n"
+            chunks.append("✅ Общие свободные окна:\n")
             for start, end, loc_info in free_intervals_with_loc:
                 start_time = self._minutes_to_time(start)
                 end_time = self._minutes_to_time(end)
                 duration = end - start
-                
+
                 # Определяем локацию
                 locations = list(loc_info.keys())
                 if locations:
@@ -962,30 +1164,29 @@ class ScheduleService:
                         loc_str = "обе группы свободны, можно выбрать любую локацию"
                     else:
                         loc_str = f"обе группы в {locations[0]}"
-                    response += f"🕐 {start_time} - {end_time} ({duration} мин) — {loc_str}\n"
+                    chunks.append(f"🕐 {start_time} - {end_time} ({duration} мин) — {loc_str}\n")
                 else:
-                    response += f"🕐 {start_time} - {end_time} ({duration} мин)\n"
+                    chunks.append(f"🕐 {start_time} - {end_time} ({duration} мин)\n")
         else:
             if min_duration > 0:
-                response += f"❌ Нет общих свободных окон длительностью от {min_duration} минут\n"
+                chunks.append(f"❌ Нет общих свободных окон длительностью от {min_duration} минут\n")
             else:
-                response += "❌ Нет общих свободных окон\n"
-        
+                chunks.append("❌ Нет общих свободных окон\n")
+
         # Показываем расписание каждой группы
-        response += "\n📚 Расписание по группам:\n\n"
+        chunks.append("\n📚 Расписание по группам:\n\n")
         for group in groups:
             lessons = schedules[group]
-            response += f"Группа {group}:\n"
+            chunks.append(f"Группа {group}:\n")
             if not lessons:
-                response += "  Занятий нет\n"
+                chunks.append("  Занятий нет\n")
             else:
-                for lesson in lessons:
-                    pair_num = lesson.get('pair_number', 0)
+                for pair_num, lesson in lessons:
                     time_slot = times.get(pair_num, "??:??-??:??")
                     subject = lesson.get('subject', 'Предмет не указан')
                     location = lesson.get('location', '')
                     rooms = lesson.get('rooms', [])
-                    
+
                     # Формируем строку с локацией/аудиторией
                     location_str = ""
                     if location:
@@ -995,11 +1196,11 @@ class ScheduleService:
                             location_str = f" [{rooms[0]}]"
                         elif isinstance(rooms, str):
                             location_str = f" [{rooms}]"
-                    
-                    response += f"  {time_slot}: {subject}{location_str}\n"
-            response += "\n"
-        
-        return response.strip()
+
+                    chunks.append(f"  {time_slot}: {subject}{location_str}\n")
+            chunks.append("\n")
+
+        return "".join(chunks).strip()
     
     async def compare_groups_period(
         self,
@@ -1035,37 +1236,56 @@ class ScheduleService:
                 return f"❌ Не удалось получить расписание для группы {group}"
             schedules[group] = schedule_data
         
-        # Формируем ответ
-        response = f"📊 Сравнение расписаний на период\n"
-        response += f"с {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}\n"
-        response += f"Группы: {', '.join(groups)}\n"
+        # Формируем ответ списком кусков с одним join в конце
+        chunks = [
+            "📊 Сравнение расписаний на период\n",
+            f"с {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}\n",
+            f"Группы: {', '.join(groups)}\n",
+        ]
         if min_duration > 0:
-            response += f"Минимальная длительность окна: {min_duration} мин\n"
-        response += f"📍 Учитываются локации корпусов\n"
-        response += "\n"
+            chunks.append(f"Минимальная длительность окна: {min_duration} мин\n")
+        chunks.append("📍 Учитываются локации корпусов\n\n")
         
+        schedule_type = '0'
+        times = self.times.get(schedule_type, {})
+
+        # Раскладываем расписание каждой группы по дням недели один раз
+        # до цикла: внутри цикла на дату остается только фильтр по
+        # диапазону дат пары, без повторного разбора структуры недели
+        by_weekday: Dict[str, List[List[Tuple[int, Dict]]]] = {}
+        for group in groups:
+            buckets: List[List[Tuple[int, Dict]]] = [[] for _ in range(7)]
+            for day_idx, weekday_name in enumerate(_WEEKDAY_KEYS):
+                day_data = schedules[group].get(weekday_name)
+                if not day_data:
+                    continue
+                bucket = buckets[day_idx]
+                for pair_num, pair_list in day_data.items():
+                    num = int(pair_num)
+                    for pair in pair_list:
+                        bucket.append((num, pair))
+                bucket.sort(key=lambda x: x[0])
+            by_weekday[group] = buckets
+
         # Проходим по каждому дню в периоде
         current_date = start_date
         days_processed = 0
-        
-        schedule_type = '0'
-        times = self.times.get(schedule_type, {})
-        
+
         while current_date <= end_date:
             if self._is_sunday(current_date):
                 current_date += timedelta(days=1)
                 continue
             
-            # Получаем занятия для каждой группы на текущую дату
-            day_schedules = {}
-            for group in groups:
-                lessons = self.get_schedule_for_date(schedules[group], current_date)
-                day_schedules[group] = lessons
-            
+            weekday = current_date.weekday()
+            date_iso = f"{current_date.year}-{current_date.month:02d}-{current_date.day:02d}"
+
             # Определяем занятые временные интервалы для каждой группы
             all_busy_intervals = []
             for group in groups:
-                lessons = day_schedules[group]
+                lessons = [
+                    item for item in by_weekday[group][weekday]
+                    if self._is_lesson_on_date(item[1], current_date, date_iso)
+                ]
                 busy_intervals = self._get_busy_intervals(lessons, schedule_type)
                 all_busy_intervals.append(busy_intervals)
             
@@ -1074,7 +1294,7 @@ class ScheduleService:
             
             # Добавляем информацию о дне, если есть свободные окна
             if free_intervals_with_loc:
-                response += f"\n📅 {current_date.strftime('%d.%m.%Y')} ({self._get_weekday_name(current_date.weekday())})\n"
+                chunks.append(f"\n📅 {current_date.strftime('%d.%m.%Y')} ({self._get_weekday_name(current_date.weekday())})\n")
                 for start, end, loc_info in free_intervals_with_loc:
                     start_time = self._minutes_to_time(start)
                     end_time = self._minutes_to_time(end)
@@ -1087,17 +1307,17 @@ class ScheduleService:
                             loc_str = "обе группы свободны, можно выбрать любую локацию"
                         else:
                             loc_str = f"обе группы в {locations[0]}"
-                        response += f"🕐 {start_time} - {end_time} ({duration} мин) — {loc_str}\n"
+                        chunks.append(f"🕐 {start_time} - {end_time} ({duration} мин) — {loc_str}\n")
                     else:
-                        response += f"🕐 {start_time} - {end_time} ({duration} мин)\n"
+                        chunks.append(f"🕐 {start_time} - {end_time} ({duration} мин)\n")
             
             current_date += timedelta(days=1)
             days_processed += 1
         
         if days_processed == 0:
-            response += "\n❌ Нет дней для анализа\n"
+            chunks.append("\n❌ Нет дней для анализа\n")
         
-        return response.strip()
+        return "".join(chunks).strip()
     
     async def compare_group_with_teacher(
         self,
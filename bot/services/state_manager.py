@@ -1,9 +1,10 @@
 """
 Менеджер состояний для интерактивных команд
 """
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 import asyncio
+import heapq
+import time
 
 
 class InteractiveStateManager:
@@ -16,6 +17,10 @@ class InteractiveStateManager:
         """
         self.ttl = ttl_seconds
         self.states: Dict[str, Dict[str, Any]] = {}
+        # Мин-куча (expires_at, key) для очистки без полного обхода;
+        # записи не удаляются при продлении/удалении состояния -
+        # устаревшие отсеиваются при извлечении (lazy delete)
+        self._expiry_heap: List[Tuple[float, str]] = []
         self._cleanup_task = None
         
     async def start_cleanup_task(self):
@@ -31,19 +36,27 @@ class InteractiveStateManager:
         self,
         chat_id: int,
         user_id: int,
-        state: Dict[str, Any]
+        state: Dict[str, Any],
+        ttl_seconds: Optional[int] = None
     ):
         """
         Установить состояние
-        
+
         Args:
             chat_id: ID чата
             user_id: ID пользователя
             state: Данные состояния
+            ttl_seconds: Индивидуальный TTL (длинные сценарии вроде
+                онбординга живут дольше дефолтных 60 секунд)
         """
         key = self._get_key(chat_id, user_id)
-        state['expires_at'] = datetime.now() + timedelta(seconds=self.ttl)
+        ttl = self.ttl if ttl_seconds is None else ttl_seconds
+        state['_ttl'] = ttl
+        # Монотонные секунды вместо datetime: дешевле в получении,
+        # сравнение - одно сравнение float без объектов
+        state['expires_at'] = time.monotonic() + ttl
         self.states[key] = state
+        heapq.heappush(self._expiry_heap, (state['expires_at'], key))
     
     def get_state(
         self,
@@ -65,7 +78,7 @@ class InteractiveStateManager:
         
         if state:
             # Проверяем срок действия
-            if datetime.now() < state.get('expires_at', datetime.now()):
+            if time.monotonic() < state.get('expires_at', 0.0):
                 return state
             else:
                 # Удаляем устаревшее состояние
@@ -92,8 +105,11 @@ class InteractiveStateManager:
         
         if state:
             state.update(new_data)
-            state['expires_at'] = datetime.now() + timedelta(seconds=self.ttl)
+            # Продлеваем на исходный TTL состояния, а не дефолтный
+            ttl = state.get('_ttl', self.ttl)
+            state['expires_at'] = time.monotonic() + ttl
             self.states[key] = state
+            heapq.heappush(self._expiry_heap, (state['expires_at'], key))
     
     def delete_state(
         self,
@@ -113,14 +129,15 @@ class InteractiveStateManager:
     
     def cleanup_expired(self):
         """Очистить устаревшие состояния"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, state in self.states.items()
-            if state.get('expires_at', now) < now
-        ]
-        
-        for key in expired_keys:
-            del self.states[key]
+        now = time.monotonic()
+        heap = self._expiry_heap
+        while heap and heap[0][0] < now:
+            ts, key = heapq.heappop(heap)
+            state = self.states.get(key)
+            # Запись в куче могла устареть: состояние продлили (в куче
+            # есть более свежая запись) или уже удалили
+            if state is not None and state.get('expires_at', now) <= ts:
+                del self.states[key]
     
     async def _cleanup_loop(self):
         """Периодическая очистка устаревших состояний"""
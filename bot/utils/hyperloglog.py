@@ -0,0 +1,56 @@
+"""
+Компактный HyperLogLog-счетчик кардинальности
+"""
+import math
+from hashlib import blake2b
+
+
+class HyperLogLog:
+    """Приближенный счетчик уникальных значений.
+
+    DAU/WAU/MAU используются только через len(), поэтому вместо set[int],
+    растущего до миллионов PyObject'ов, достаточно ~единиц КБ регистров
+    с погрешностью ~1%.
+    """
+
+    def __init__(self, error_rate: float = 0.01):
+        """
+        Args:
+            error_rate: Допустимая относительная погрешность (например 0.01)
+        """
+        p = int(math.ceil(math.log2((1.04 / error_rate) ** 2)))
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self._alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, value: int):
+        """Учесть значение"""
+        h = int.from_bytes(
+            blake2b(value.to_bytes(8, 'little', signed=True), digest_size=8).digest(),
+            'big'
+        )
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def card(self) -> float:
+        """Оценка числа уникальных значений"""
+        est = self._alpha * self.m * self.m / sum(
+            2.0 ** -r for r in self.registers
+        )
+        # Коррекция для малых значений
+        if est <= 2.5 * self.m:
+            zeros = self.registers.count(0)
+            if zeros:
+                est = self.m * math.log(self.m / zeros)
+        return est
+
+    def clear(self):
+        """Сбросить счетчик"""
+        self.registers = bytearray(self.m)
+
+    def __len__(self) -> int:
+        return int(self.card())
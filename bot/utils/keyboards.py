@@ -1,6 +1,7 @@
 """
 Вспомогательные функции для создания клавиатур
 """
+from functools import lru_cache
 from typing import List, Optional
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -85,6 +86,7 @@ def build_pagination_keyboard(
     return builder.as_markup()
 
 
+@lru_cache(maxsize=256)
 def build_settings_keyboard(
     daily_notify_enabled: bool = True,
     notify_online: bool = True,
@@ -93,7 +95,10 @@ def build_settings_keyboard(
 ) -> InlineKeyboardMarkup:
     """
     Создать клавиатуру настроек
-    
+
+    Клавиатура детерминирована по аргументам, поэтому результат кэшируется -
+    повторные клики не пересоздают кнопки заново.
+
     Args:
         daily_notify_enabled: Включены ли ежедневные уведомления
         notify_online: Включены ли уведомления об онлайн парах
@@ -153,10 +158,13 @@ def build_settings_keyboard(
     return builder.as_markup()
 
 
+@lru_cache(maxsize=8)
 def build_subgroup_keyboard(prefix: str = "subgroup") -> InlineKeyboardMarkup:
     """
     Создать клавиатуру выбора подгруппы
-    
+
+    Клавиатура статична для каждого префикса, результат кэшируется.
+
     Returns:
         InlineKeyboardMarkup
     """
@@ -17,6 +17,11 @@ class MessagePriority(Enum):
     LOW = 3       # Массовые рассылки
 
 
+# Окно склейки текстов одному чату (сек) и лимит Telegram на сообщение
+_COALESCE_WINDOW = 0.2
+_MAX_TEXT_LEN = 4096
+
+
 @dataclass(order=True)
 class QueuedMessage:
     """Сообщение в очереди"""
@@ -57,6 +62,10 @@ class MessageQueue:
         # Rate limiting
         self.last_send_times: list[float] = []
         self.lock = asyncio.Lock()
+
+        # Склейка текстов: простые send_message одному чату, попавшие
+        # в окно ~200мс (расписание + напоминание), уходят одним вызовом
+        self._pending_texts: Dict[Any, QueuedMessage] = {}
     
     async def start(self):
         """Запустить обработку очереди"""
@@ -113,8 +122,41 @@ class MessageQueue:
             kwargs=kwargs,
             max_retries=max_retries
         )
-        
+
+        # Кандидат на склейку: голый send_message(chat_id, text).
+        # Сообщения с клавиатурами/форматированием идут обычным путем
+        if (
+            getattr(func, '__name__', '') == 'send_message'
+            and len(args) == 2
+            and isinstance(args[1], str)
+            and not kwargs
+        ):
+            chat_id = args[0]
+            pending = self._pending_texts.get(chat_id)
+            if pending is not None:
+                combined = f"{pending.args[1]}\n\n{args[1]}"
+                if len(combined) <= _MAX_TEXT_LEN:
+                    pending.args = (chat_id, combined)
+                    # Склейка наследует самый высокий из приоритетов
+                    pending.priority = min(pending.priority, message.priority)
+                    return
+                # Склейка не влезает в лимит: отправляем накопленное
+                # сразу, иначе новое сообщение молча затерло бы его
+                del self._pending_texts[chat_id]
+                await self.queue.put(pending)
+
+            self._pending_texts[chat_id] = message
+            asyncio.create_task(self._flush_pending(chat_id))
+            return
+
         await self.queue.put(message)
+
+    async def _flush_pending(self, chat_id):
+        """Отправить склеенное сообщение чата по истечении окна"""
+        await asyncio.sleep(_COALESCE_WINDOW)
+        message = self._pending_texts.pop(chat_id, None)
+        if message is not None:
+            await self.queue.put(message)
     
     async def _worker(self, worker_id: int):
         """Воркер для обработки сообщений из очереди"""
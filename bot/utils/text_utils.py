@@ -2,9 +2,14 @@
 Утилиты для работы с текстом
 """
 import re
+from functools import lru_cache
 from typing import List
 from datetime import datetime
 
+# Скомпилированный паттерн времени HH:MM - используется на каждом
+# пользовательском вводе времени
+_TIME_RE = re.compile(r'^([0-1][0-9]|2[0-3]):[0-5][0-9]$')
+
 
 def escape_markdown_v2(text: str) -> str:
     """
@@ -173,18 +178,21 @@ def clean_whitespace(text: str) -> str:
     return text.strip()
 
 
+@lru_cache(maxsize=512)
 def validate_time_format(time_str: str) -> bool:
     """
     Проверить формат времени (HH:MM)
-    
+
+    Валидных значений всего 1440, так что кэш быстро покрывает
+    реальные вводы без повторного прогона регулярки
+
     Args:
         time_str: Строка времени
-        
+
     Returns:
         True если формат правильный
     """
-    pattern = r'^([0-1][0-9]|2[0-3]):[0-5][0-9]$'
-    return bool(re.match(pattern, time_str))
+    return bool(_TIME_RE.match(time_str))
 
 
 def validate_date_format(date_str: str) -> bool:
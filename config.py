@@ -1,6 +1,7 @@
 """
 Конфигурация приложения
 """
+from functools import cached_property
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List
 
@@ -69,6 +70,11 @@ class Settings(BaseSettings):
             return []
         return [int(x.strip()) for x in self.admin_user_ids.split(",") if x.strip()]
 
+    @cached_property
+    def admin_ids_set(self) -> frozenset[int]:
+        """Множество ID администраторов для O(1) проверки"""
+        return frozenset(self.admin_ids_list)
+
 
 # Глобальный объект настроек
 settings = Settings()
@@ -68,13 +68,19 @@ class BlockedUser(Base):
 class Holiday(Base):
     """Модель праздников и каникул"""
     __tablename__ = "holidays"
-    
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     group: Mapped[str] = mapped_column(String(50), nullable=False)
+    # Даты хранятся строками ISO (YYYY-MM-DD) - сортируются
+    # лексикографически, поэтому диапазонный запрос идет по индексу
     start_date: Mapped[str] = mapped_column(String(20), nullable=False)
     end_date: Mapped[str] = mapped_column(String(20), nullable=False)
     type: Mapped[str] = mapped_column(String(50), nullable=False)
 
+    __table_args__ = (
+        Index('idx_holidays_group_dates', 'group', 'start_date', 'end_date'),
+    )
+
 
 class SemesterBoundary(Base):
     """Модель границ семестра"""
@@ -172,6 +178,9 @@ class FeedbackMessage(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     user_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
-    media_ids: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Типизированные колонки вместо JSON-блоба: медиа всегда одно,
+    # так что пара (тип, file_id) снимает сериализацию на hot path
+    media_type: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    media_file_id: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
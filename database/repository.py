@@ -3,7 +3,8 @@
 """
 from typing import Optional, List
 from datetime import datetime
-from sqlalchemy import select, delete, update, and_, or_
+from sqlalchemy import select, delete, update, and_, or_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import (
@@ -32,6 +33,15 @@ class UserRepository:
         await session.flush()
         return user
     
+    @staticmethod
+    async def upsert(session: AsyncSession, user_id: int, **fields):
+        """Создать или обновить пользователя одним INSERT ... ON CONFLICT"""
+        await session.execute(
+            pg_insert(User)
+            .values(userid=user_id, **fields)
+            .on_conflict_do_update(index_elements=['userid'], set_=fields)
+        )
+
     @staticmethod
     async def update(session: AsyncSession, user_id: int, **kwargs) -> Optional[User]:
         """Обновить пользователя"""
@@ -169,14 +179,16 @@ class FeedbackRepository:
         session: AsyncSession,
         user_id: int,
         user_message_id: Optional[int] = None,
-        media_ids: Optional[str] = None,
+        media_type: Optional[str] = None,
+        media_file_id: Optional[str] = None,
         text: Optional[str] = None
     ) -> FeedbackMessage:
         """Создать фидбек"""
         feedback = FeedbackMessage(
             user_id=user_id,
             user_message_id=user_message_id,
-            media_ids=media_ids,
+            media_type=media_type,
+            media_file_id=media_file_id,
             text=text
         )
         session.add(feedback)
@@ -190,7 +202,23 @@ class FeedbackRepository:
             select(FeedbackMessage).where(FeedbackMessage.id == feedback_id)
         )
         return result.scalar_one_or_none()
-    
+
+    @staticmethod
+    async def get_with_user(
+        session: AsyncSession,
+        feedback_id: int
+    ) -> tuple[Optional[FeedbackMessage], Optional[User]]:
+        """Получить фидбек вместе с автором одним запросом (JOIN)"""
+        result = await session.execute(
+            select(FeedbackMessage, User)
+            .outerjoin(User, User.userid == FeedbackMessage.user_id)
+            .where(FeedbackMessage.id == feedback_id)
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None, None
+        return row[0], row[1]
+
     @staticmethod
     async def get_all(session: AsyncSession) -> List[FeedbackMessage]:
         """Получить все фидбеки"""
@@ -198,7 +226,27 @@ class FeedbackRepository:
             select(FeedbackMessage).order_by(FeedbackMessage.id.asc())
         )
         return list(result.scalars().all())
-    
+
+    @staticmethod
+    async def get_page(
+        session: AsyncSession,
+        offset: int,
+        limit: int
+    ) -> List[FeedbackMessage]:
+        """Получить страницу фидбеков (LIMIT/OFFSET на стороне БД)"""
+        result = await session.execute(
+            select(FeedbackMessage)
+            .order_by(FeedbackMessage.id.asc())
+            .offset(offset)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def count(session: AsyncSession) -> int:
+        """Получить общее количество фидбеков"""
+        return await session.scalar(select(func.count(FeedbackMessage.id)))
+
     @staticmethod
     async def delete(session: AsyncSession, feedback_id: int):
         """Удалить фидбек"""
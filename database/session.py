@@ -8,8 +8,6 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker
 )
-from sqlalchemy.pool import NullPool
-
 from config import settings
 
 
@@ -20,8 +18,16 @@ class DatabaseSession:
         self.engine: AsyncEngine = create_async_engine(
             settings.database_url,
             echo=False,
-            poolclass=NullPool,  # Для асинхронной работы
+            # Пул вместо NullPool: соединение на каждый запрос заново -
+            # это TCP+TLS+auth на каждый апдейт; размер с запасом под
+            # параллельные фоновые джобы
+            pool_size=20,
+            max_overflow=20,
             pool_pre_ping=True,
+            # Увеличенный кэш скомпилированных statement'ов: репозитории
+            # гоняют одни и те же select/delete на каждый запрос,
+            # повторная компиляция SQL - чистый CPU на event loop'е
+            query_cache_size=1200,
         )
         
         self.async_session_maker = async_sessionmaker(
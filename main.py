@@ -78,7 +78,12 @@ async def on_startup(dp: Dispatcher):
     
     # Инициализируем базу данных
     await init_database()
-    
+
+    # Прогреваем кэш зарегистрированных пользователей/чатов
+    from bot.services.registration_cache import registration_cache
+    async for session in db_session.get_session():
+        await registration_cache.warm(session)
+
     # Запускаем HTTP сервер для метрик
     logger.info("Starting metrics server...")
     metrics_server: MetricsServer = dp['metrics_server']
@@ -92,7 +97,11 @@ async def on_startup(dp: Dispatcher):
     # Запускаем сервис уведомлений
     notification_service: NotificationService = dp['notification_service']
     notification_service.start()
-    
+
+    # Запускаем сервис очистки клавиатур
+    keyboard_cleanup_service: KeyboardCleanupService = dp['keyboard_cleanup_service']
+    await keyboard_cleanup_service.start()
+
     # Запускаем сервис бизнес-метрик
     business_metrics_service.start()
     
@@ -120,7 +129,11 @@ async def on_shutdown(dp: Dispatcher):
     
     # Останавливаем сервис бизнес-метрик
     await business_metrics_service.stop()
-    
+
+    # Останавливаем сервис очистки клавиатур
+    keyboard_cleanup_service: KeyboardCleanupService = dp['keyboard_cleanup_service']
+    await keyboard_cleanup_service.stop()
+
     # Останавливаем очередь сообщений
     message_queue: MessageQueue = dp['message_queue']
     await message_queue.stop()
@@ -129,6 +142,10 @@ async def on_shutdown(dp: Dispatcher):
     metrics_server: MetricsServer = dp['metrics_server']
     await metrics_server.stop()
     
+    # Закрываем HTTP клиент внешнего API
+    from bot.services.api_client import api_client
+    await api_client.close()
+
     # Закрываем соединение с БД
     await db_session.close()
     
@@ -214,6 +231,15 @@ async def main():
 
 
 if __name__ == "__main__":
+    # Бот почти целиком network-bound: libuv-цикл uvloop заметно быстрее
+    # дефолтного селектора на aiohttp/aiogram нагрузке. На платформах без
+    # uvloop (Windows) остается стандартный event loop
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,37 @@
+"""
+Тесты кэша страниц списка фидбеков
+"""
+import asyncio
+
+import bot.services.feedback as feedback_module
+from bot.services.feedback import FeedbackService
+from database.repository import FeedbackRepository
+
+
+def test_second_page_request_within_ttl_skips_repository(monkeypatch):
+    """Повторный запрос страницы в пределах TTL не ходит в БД,
+    в том числе из другого экземпляра сервиса (хендлеры создают
+    FeedbackService на каждый апдейт)"""
+    feedback_module._page_cache.clear()
+    calls = {"get_page": 0, "count": 0}
+
+    async def fake_get_page(session, offset, limit):
+        calls["get_page"] += 1
+        return ["row"]
+
+    async def fake_count(session):
+        calls["count"] += 1
+        return 1
+
+    monkeypatch.setattr(FeedbackRepository, "get_page", staticmethod(fake_get_page))
+    monkeypatch.setattr(FeedbackRepository, "count", staticmethod(fake_count))
+
+    async def scenario():
+        first = await FeedbackService(bot=None).get_feedbacks_list(None, page=0)
+        second = await FeedbackService(bot=None).get_feedbacks_list(None, page=0)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first == second == (["row"], 1)
+    assert calls == {"get_page": 1, "count": 1}